@@ -1,6 +1,5 @@
-from collections import deque
-import random
 import os
+import argparse
 import json
 from dotenv import load_dotenv
 
@@ -8,12 +7,17 @@ import paho.mqtt.client as paho
 from paho import mqtt
 import time
 
+from coordination import TeamCoordinator, intents_topic
+from policies import POLICIES, DECISION_BUDGET, PolicyRunner, make_policy
+from vision import Vision
+from sequencing import GAME_QOS, SPECTATOR_QOS, NEW, REPEAT, StateSequencer, move_payload, start_payload
+from tracing import now_us, new_trace_id, move_properties, read_context, breakdown, format_breakdown
+
 game_running = False
 next_move = False
 game_state = None
-game_map = [["N" for i in range(10)] for j in range(10)]
-coins = set()
-walls = set()
+bot = None
+sequencer = StateSequencer()
 
 # setting callbacks for different events to see if it works, print the message etc.
 def on_connect(client, userdata, flags, rc, properties=None):
@@ -71,10 +75,30 @@ def on_message(client, userdata, msg):
     if msg.topic.endswith('/lobby') and msg.payload.decode() == 'Game Over: All coins have been collected':
         game_running = False
     elif msg.topic.endswith('/game_state'):
-        next_move = True
-        game_state = json.loads(msg.payload.decode())
-    elif msg.topic.endswith('/start') and msg.payload.decode() == 'START':
+        arrived = now_us()
+        state = json.loads(msg.payload.decode())
+        status = sequencer.receive(state)
+        if status == NEW:
+            next_move = True
+            game_state = state
+            times = breakdown(read_context(msg.properties), arrived)
+            if times is not None:
+                print("Round trip", format_breakdown(times))
+        elif status == REPEAT:
+            # redelivered, or sent again by a server that took over, the move made for it may not have arrived
+            sent = sequencer.resend()
+            if sent is not None:
+                payload, trace_id = sent
+                properties = None if trace_id is None else move_properties(trace_id)
+                client.publish(msg.topic[:-len('game_state')] + 'move', payload, qos=GAME_QOS, properties=properties)
+    elif msg.topic.endswith('/start') and msg.payload.decode().split(' ')[0] == 'START':
         game_running = True
+    elif msg.topic.endswith('/intents') and bot.coordinator is not None:
+        runner.call(bot.coordinator.receive, msg.payload)
+    elif msg.topic.endswith('/map'):
+        map_info = json.loads(msg.payload.decode())
+        runner.call(bot.set_dimensions, map_info["height"], map_info["width"])
+        runner.call(bot.set_vision, Vision.fromMapInfo(map_info, bot.player_name))
 
 def lobby_prompt():
     print("Welcome to the Tech Assignment 1 Game as a Player!")
@@ -95,121 +119,15 @@ def lobby_prompt():
         case 2:
             return (lobby_name, player_name, team_name, False)
 
-def print_map():
-    for i in range(len(game_map)):
-        row = ""
-        for j in range(len(game_map[0])):
-            row += game_map[i][j] + " "
-        print(row)
-
-def construct_map():
-    # how far the player can see on the map at any given time
-    vision_radius = 2
-    # get game position info
-    player_pos = game_state["currentPosition"]
-    obstacle_pos = game_state["walls"] + game_state["teammatePositions"] + game_state["enemyPositions"]
-    coin_pos = game_state["coin1"] + game_state["coin2"] + game_state["coin3"]
-    # calculate coordinates near player
-    player_x, player_y = player_pos[0], player_pos[1]
-    min_x = max(player_x - vision_radius, 0)
-    max_x = min(player_x + vision_radius, 10)
-    min_y = max(player_y - vision_radius, 0)
-    max_y = min(player_y + vision_radius, 10)
-    # reset space near player
-    for x in range(min_x, max_x):
-        for y in range(min_y, max_y):
-            game_map[x][y] = "N"
-    # place player
-    game_map[player_x][player_y] = "P"
-    # place obstacles
-    for pos in obstacle_pos:
-        game_map[pos[0]][pos[1]] = "O"
-    # place coins
-    for pos in coin_pos:
-        game_map[pos[0]][pos[1]] = "C"
-
-def bfs(start: tuple[int, int]):
-    frontier = deque()
-    explored = set()
-    previous = {}
-    # search for nearest coin using bfs
-    explored.add(start)
-    frontier.append(start)
-    while len(frontier) != 0:
-        current = frontier.popleft()
-        for dir in directions:
-            x = current[0]+dir[0]
-            y = current[1]+dir[1]
-            if valid_coord(x, y):
-                s = game_map[x][y]
-                neighbor = (x, y)
-                if neighbor not in explored and s != "O":
-                    explored.add(neighbor)
-                    previous[neighbor] = current
-                    if s == "C":
-                        return move_from_path(start, previous, neighbor)
-                    frontier.append(neighbor)
-    return None
-
-def valid_coord(x, y):
-    return (x >= 0 and x < 10) and (y >= 0 and y < 10)
-
-directions = [
-    (-1, 0),
-    (1, 0),
-    (0, -1),
-    (0, 1),
-]
-
-direction_mapping = {
-    directions[0] : "UP",
-    directions[1] : "DOWN",
-    directions[2] : "LEFT",
-    directions[3] : "RIGHT",
-}
-
-def move_from_path(start, previous, end):
-    # backtrack from the end node to the front and return the next correct move
-    current = end
-    while previous[current] != start:
-        current = previous[current]
-    difference = (current[0]-start[0], current[1]-start[1])
-    return direction_mapping[difference]
-
-def make_move():
-    # update the map with the current game state
-    construct_map()
-    # get player's current position
-    player_pos = game_state["currentPosition"]
-    start_node = (player_pos[0], player_pos[1])
-    # find path to nearest coin using bfs
-    new_move = bfs(start_node)
-    # if no coin is found, move in a random direction until agent hits a wall, then switch direction
-    if not new_move:
-        new_move = gen_random_move(player_pos)
-    return new_move
-
-dir = directions[0]
-def gen_random_move(pos):
-    global dir
-    x = pos[0] + dir[0]
-    y = pos[1] + dir[1]
-    # if neighboring cell in the current direction is not a valid move
-    while not valid_coord(x, y) or game_map[x][y] == "O":
-        # choose new direction in a counter-clockwise manner
-        if direction_mapping[dir] == "UP":
-            dir = directions[2]
-        elif direction_mapping[dir] == "DOWN":
-            dir = directions[3]
-        elif direction_mapping[dir] == "LEFT":
-            dir = directions[1]
-        elif direction_mapping[dir] == "RIGHT":
-            dir = directions[0]
-        x = pos[0] + dir[0]
-        y = pos[1] + dir[1]
-    return direction_mapping[dir]
-
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play the game with an AI player")
+    parser.add_argument('--coordinate', action='store_true', help="split coins with teammates over the team topic")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='planner', help="how the bot decides its moves")
+    parser.add_argument('--budget', type=float, default=DECISION_BUDGET, help="seconds the bot may spend on each move")
+    parser.add_argument('--board-size', help="HEIGHTxWIDTH to ask for when creating the lobby, the server's default if left out")
+    parser.add_argument('--vision', help="SHAPE:RADIUS[:los] to ask for when creating the lobby, the server's default if left out")
+    args = parser.parse_args()
+
     load_dotenv(dotenv_path='./credentials.env')
     
     broker_address = os.environ.get('BROKER_ADDRESS')
@@ -218,6 +136,10 @@ if __name__ == '__main__':
     password = os.environ.get('PASSWORD')
 
     lobby_name, player_name, team_name, creating_lobby = lobby_prompt()
+    bot = make_policy(args.policy, player_name)
+    runner = PolicyRunner(bot)
+    if args.coordinate:
+        bot.coordinator = TeamCoordinator(player_name)
 
     client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id=f"{player_name}", userdata=None, protocol=paho.MQTTv5)
 
@@ -235,20 +157,23 @@ if __name__ == '__main__':
 
     client.loop_start()
 
-    client.subscribe(f"games/{lobby_name}/lobby", qos=2)
-    client.subscribe(f'games/{lobby_name}/{player_name}/game_state', qos=2)
-    client.subscribe(f'games/{lobby_name}/scores', qos=2)
-    client.subscribe(f'games/{lobby_name}/start', qos=2)
+    client.subscribe(f"games/{lobby_name}/lobby", qos=GAME_QOS)
+    client.subscribe(f'games/{lobby_name}/{player_name}/game_state', qos=GAME_QOS)
+    client.subscribe(f'games/{lobby_name}/scores', qos=SPECTATOR_QOS)
+    client.subscribe(f'games/{lobby_name}/start', qos=GAME_QOS)
+    client.subscribe(f'games/{lobby_name}/map', qos=GAME_QOS)
+    if args.coordinate:
+        client.subscribe(intents_topic(lobby_name, team_name), qos=0)
 
     client.publish("new_game", json.dumps({'lobby_name' : lobby_name,
                                            'team_name' : team_name,
-                                           'player_name' : player_name}), qos=2)
+                                           'player_name' : player_name}), qos=GAME_QOS)
     time.sleep(1)
 
     if creating_lobby:
         print("Waiting for other players to join...")
         input("Press enter to start the game: ")
-        client.publish(f"games/{lobby_name}/start", "START", qos=2)
+        client.publish(f"games/{lobby_name}/start", start_payload(args.board_size, args.vision), qos=GAME_QOS)
         time.sleep(1)
     else:
         print("Waiting for game to start...")
@@ -262,15 +187,22 @@ if __name__ == '__main__':
         time.sleep(0.5) # Wait for subsequent messages
         if not game_running:
             break
-        move = make_move()
+        state = game_state
+        move = runner.decide(state, args.budget).name
         next_move = False
         print("Decided on move:", move)
-        client.publish(f"games/{lobby_name}/{player_name}/move", move, qos=2)
+        payload = move_payload(move, state.get('tick'))
+        trace_id = new_trace_id()
+        sequencer.record(state.get('tick'), payload, trace_id)
+        client.publish(f"games/{lobby_name}/{player_name}/move", payload, qos=GAME_QOS, properties=move_properties(trace_id))
+        intent = runner.intent_payload() if bot.coordinator is not None else None
+        if intent is not None:
+            client.publish(intents_topic(lobby_name, team_name), intent, qos=0)
         time.sleep(0.5)
         print("Waiting for all players to make a move...")
 
     if creating_lobby:
-        client.publish(f"games/{lobby_name}/start", "STOP", qos=2)
+        client.publish(f"games/{lobby_name}/start", "STOP", qos=GAME_QOS)
         time.sleep(1)
 
     print("Game has ended!")
@@ -0,0 +1,171 @@
+#
+# Copyright 2021 HiveMQ GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import json
+import time
+import argparse
+import threading
+from dotenv import load_dotenv
+
+import paho.mqtt.client as paho
+from paho import mqtt
+
+import random
+
+# counts of publishes handed to paho and acknowledged by the broker, the callback runs on the network thread
+stats = {'sent': 0, 'samples': 0, 'acked': 0}
+stats_lock = threading.Lock()
+
+# setting callbacks for different events to see if it works, print the message etc.
+def on_connect(client, userdata, flags, rc, properties=None):
+    """
+        Prints the result of the connection with a reasoncode to stdout ( used as callback for connect )
+        :param client: the client itself
+        :param userdata: userdata is set when initiating the client, here it is userdata=None
+        :param flags: these are response flags sent by the broker
+        :param rc: stands for reasonCode, which is a code for the connection result
+        :param properties: can be used in MQTTv5, but is optional
+    """
+    print("CONNACK received with code %s." % rc)
+
+# with this callback you can see if your publish was successful
+def on_publish(client, userdata, mid, properties=None):
+    """
+        Counts a successful publish ( used as callback for publish ), printing every mid would cap the rate
+        :param client: the client itself
+        :param userdata: userdata is set when initiating the client, here it is userdata=None
+        :param mid: variable returned from the corresponding publish() call, to allow outgoing messages to be tracked
+        :param properties: can be used in MQTTv5, but is optional
+    """
+    with stats_lock:
+        stats['acked'] += 1
+
+class VirtualPublisher:
+    def __init__(self, topic: str, negative: bool = False, publisher_id: str = None):
+        """
+            One logical client, many of them share a single connection
+            :param topic: topic the samples are published to
+            :param negative: publish values in (-1, 0] instead of [0, 1)
+            :param publisher_id: when set, samples are wrapped in an envelope with this id, a sequence number and the send time
+        """
+        self.topic = topic
+        self.sign = -1 if negative else 1
+        self.publisher_id = publisher_id
+        self.seq = 0
+
+    def sample(self):
+        return random.random() * self.sign
+
+    def payload(self, batch: int):
+        value = self.sample() if batch == 1 else [self.sample() for _ in range(batch)]
+        if self.publisher_id is not None:
+            self.seq += 1
+            return json.dumps({'pub': self.publisher_id, 'seq': self.seq, 'ts': time.time_ns(), 'v': value})
+        # a single sample is sent bare so plain subscribers still read it as a number
+        if batch == 1:
+            return value
+        return json.dumps(value)
+
+def report(elapsed, interval_stats):
+    print(f"{elapsed:8.1f}s  {interval_stats['sent'] / interval_stats['time']:10.1f} msg/s  "
+          f"{interval_stats['samples'] / interval_stats['time']:10.1f} samples/s  "
+          f"{interval_stats['acked'] / interval_stats['time']:10.1f} acked/s")
+
+def run(client, publishers, rate, batch, qos, duration, report_every):
+    """
+        Publishes round robin over the virtual publishers at the target total message rate
+    """
+    interval = 1 / rate
+    start = time.perf_counter()
+    next_send = start
+    last_report = start
+    last = dict(stats)
+    i = 0
+    while duration is None or time.perf_counter() - start < duration:
+        now = time.perf_counter()
+        if now < next_send:
+            time.sleep(next_send - now)
+        publisher = publishers[i % len(publishers)]
+        client.publish(publisher.topic, payload=publisher.payload(batch), qos=qos)
+        with stats_lock:
+            stats['sent'] += 1
+            stats['samples'] += batch
+        i += 1
+        # schedule from the plan rather than from now, so a slow publish is caught up instead of lowering the rate
+        next_send += interval
+
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            with stats_lock:
+                current = dict(stats)
+            report(now - start, {key: current[key] - last[key] for key in current} | {'time': now - last_report})
+            last, last_report = current, now
+    total = time.perf_counter() - start
+    report(total, dict(stats) | {'time': total})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Publish random numbers from many virtual clients over one connection")
+    parser.add_argument('--publishers', type=int, default=1, help="number of virtual publishers")
+    parser.add_argument('--first', type=int, default=1, help="publisher i publishes to numbers/client<first + i>")
+    parser.add_argument('--negative', action='store_true', help="publish negative numbers")
+    parser.add_argument('--rate', type=float, default=1/3, help="target messages per second over all publishers")
+    parser.add_argument('--batch', type=int, default=1, help="samples packed into each message")
+    parser.add_argument('--qos', type=int, choices=(0, 1, 2), default=1)
+    parser.add_argument('--inflight', type=int, default=1000, help="unacknowledged QoS 1/2 messages allowed at once")
+    parser.add_argument('--duration', type=float, default=None, help="seconds to run for, runs until interrupted by default")
+    parser.add_argument('--report', type=float, default=5, help="seconds between throughput reports")
+    parser.add_argument('--envelope', action='store_true', help="add publisher id, sequence number and send time for latency and loss measurement")
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path='./credentials.env')
+
+    broker_address = os.environ.get('BROKER_ADDRESS')
+    broker_port = int(os.environ.get('BROKER_PORT'))
+    username = os.environ.get('USER_NAME')
+    password = os.environ.get('PASSWORD')
+
+    # using MQTT version 5 here, for 3.1.1: MQTTv311, 3.1: MQTTv31
+    # userdata is user defined data of any type, updated by user_data_set()
+    # client_id is the given name of the client
+    client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id="", userdata=None, protocol=paho.MQTTv5)
+    client.on_connect = on_connect
+    client.max_inflight_messages_set(args.inflight)
+
+    # enable TLS for secure connection
+    client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
+    # set username and password
+    client.username_pw_set(username, password)
+    # connect to HiveMQ Cloud on port 8883 (default for MQTT)
+    client.connect(broker_address, broker_port)
+
+    # setting callbacks, use separate functions like above for better visibility
+    client.on_publish = on_publish
+
+    # a fresh run id keeps sequence numbers from a restarted publisher apart from the old ones
+    run_id = os.urandom(4).hex()
+    publishers = [VirtualPublisher(f"numbers/client{args.first + i}", args.negative,
+                                   f"{run_id}-{args.first + i}" if args.envelope else None)
+                  for i in range(args.publishers)]
+
+    # loop_start runs the network loop on its own thread while this one publishes
+    client.loop_start()
+
+    try:
+        run(client, publishers, args.rate, args.batch, args.qos, args.duration, args.report)
+    except KeyboardInterrupt:
+        pass
+    client.loop_stop()
+    client.disconnect()
@@ -13,11 +13,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import os
+import json
+import math
 import time
+import argparse
+import threading
+from dotenv import load_dotenv
 
 import paho.mqtt.client as paho
 from paho import mqtt
 
+from streamstats import WindowedStats, DeliveryStats
+from samplesink import SampleSink
+
+# {topic: WindowedStats}, written by the network thread and read by the reporting loop
+topic_stats = {}
+# {publisher id: DeliveryStats} for publishers that send envelopes
+delivery_stats = {}
+stats_lock = threading.Lock()
+
 # setting callbacks for different events to see if it works, print the message etc.
 def on_connect(client, userdata, flags, rc, properties=None):
     """
@@ -53,37 +68,125 @@ def on_subscribe(client, userdata, mid, granted_qos, properties=None):
     """
     print("Subscribed: " + str(mid) + " " + str(granted_qos))
 
-# print message, useful for checking if it was successful
+def parse_samples(payload):
+    """
+        Converts and checks everything on_message uses, so a bad payload is rejected here instead of raising on the
+        network thread halfway through updating the stats
+        :return: (samples as floats, envelope), where envelope is None unless the publisher wrapped its samples in one
+        :raises ValueError, KeyError, TypeError: for payloads that are not valid telemetry
+    """
+    # publishers send a bare number, a JSON list of numbers, or either of them inside an envelope
+    value = json.loads(payload)
+    envelope = None
+    if isinstance(value, dict):
+        envelope = {'pub': str(value['pub']), 'seq': int(value['seq']), 'ts': int(value['ts'])}
+        value = value['v']
+    samples = [float(x) for x in (value if isinstance(value, list) else [value])]
+    # json accepts NaN and Infinity, which no summary can bucket
+    if not all(math.isfinite(x) for x in samples):
+        raise ValueError("non-finite sample")
+    return samples, envelope
+
+# add the samples to the topic's window, the summaries are printed on a schedule instead of per message
 def on_message(client, userdata, msg):
     """
-        Prints a mqtt message to stdout ( used as callback for subscribe )
+        Aggregates the samples in a mqtt message ( used as callback for subscribe )
         :param client: the client itself
-        :param userdata: userdata is set when initiating the client, here it is userdata=None
+        :param userdata: userdata holds the window and step in seconds for new topics and the optional sink
         :param msg: the message with topic and payload
     """
-    print(msg.topic + " " + str(msg.qos) + " " + str(msg.payload))
-
-# using MQTT version 5 here, for 3.1.1: MQTTv311, 3.1: MQTTv31
-# userdata is user defined data of any type, updated by user_data_set()
-# client_id is the given name of the client
-client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id="", userdata=None, protocol=paho.MQTTv5)
-client.on_connect = on_connect
-
-# enable TLS for secure connection
-client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
-# set username and password
-client.username_pw_set("eflemus", "Arpanet20193")
-# connect to HiveMQ Cloud on port 8883 (default for MQTT)
-client.connect("cf3e3ebf5db14ab7beadd8fff3ec1dc5.s1.eu.hivemq.cloud", 8883)
-
-# setting callbacks, use separate functions like above for better visibility
-client.on_subscribe = on_subscribe
-client.on_message = on_message
-client.on_publish = on_publish
-
-# subscribe to all topics of numbers by using the wildcard "#"
-client.subscribe("numbers/#", qos=1)
-
-# loop_forever for simplicity, here you need to stop the loop manually
-# you can also use loop_start and loop_stop
-client.loop_forever()
\ No newline at end of file
+    try:
+        samples, envelope = parse_samples(msg.payload)
+    except (ValueError, KeyError, TypeError):
+        print("Ignoring malformed payload on " + msg.topic)
+        return
+    now_ns = time.time_ns()
+    now = now_ns / 1e9
+    with stats_lock:
+        stats = topic_stats.get(msg.topic)
+        if stats is None:
+            stats = topic_stats[msg.topic] = WindowedStats(userdata['window'], userdata['step'])
+        for x in samples:
+            stats.add(x, now)
+        if envelope is not None:
+            delivery = delivery_stats.get(envelope['pub'])
+            if delivery is None:
+                delivery = delivery_stats[envelope['pub']] = DeliveryStats()
+            delivery.add(envelope['seq'], envelope['ts'], now_ns)
+    if userdata['sink'] is not None:
+        userdata['sink'].add(msg.topic, samples, now_ns)
+
+def print_summaries(now):
+    with stats_lock:
+        summaries = {topic: stats.summary(now) for topic, stats in topic_stats.items()}
+        deliveries = {publisher: stats.summary() for publisher, stats in delivery_stats.items()}
+    for topic, summary in sorted(summaries.items()) + sorted(deliveries.items()):
+        if summary is None:
+            continue
+        print(f"{topic}: " + "  ".join(f"{key}={value}" if isinstance(value, int) else f"{key}={value:.4g}"
+                                          for key, value in summary.items()))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Summarise numbers/# telemetry over time windows")
+    parser.add_argument('--window', type=float, default=10, help="seconds covered by each summary")
+    parser.add_argument('--step', type=float, default=None, help="seconds between summaries, defaults to the window (tumbling)")
+    parser.add_argument('--qos', type=int, choices=(0, 1, 2), default=1)
+    parser.add_argument('--sink', default=None, help="directory to also store every sample in, as binary segments")
+    parser.add_argument('--flush-bytes', type=int, default=1 << 16, help="buffered bytes that trigger a write to the sink")
+    parser.add_argument('--flush-interval', type=float, default=1.0, help="seconds after which buffered samples are written anyway")
+    parser.add_argument('--segment-mb', type=float, default=64, help="size at which the sink starts a new segment")
+    args = parser.parse_args()
+    step = args.window if args.step is None else args.step
+    sink = None
+    if args.sink is not None:
+        sink = SampleSink(args.sink, args.flush_bytes, args.flush_interval, int(args.segment_mb * (1 << 20)))
+
+    load_dotenv(dotenv_path='./credentials.env')
+
+    broker_address = os.environ.get('BROKER_ADDRESS')
+    broker_port = int(os.environ.get('BROKER_PORT'))
+    username = os.environ.get('USER_NAME')
+    password = os.environ.get('PASSWORD')
+
+    # using MQTT version 5 here, for 3.1.1: MQTTv311, 3.1: MQTTv31
+    # userdata is user defined data of any type, updated by user_data_set()
+    # client_id is the given name of the client
+    client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id="", userdata={'window': args.window, 'step': step, 'sink': sink}, protocol=paho.MQTTv5)
+    client.on_connect = on_connect
+
+    # enable TLS for secure connection
+    client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
+    # set username and password
+    client.username_pw_set(username, password)
+    # connect to HiveMQ Cloud on port 8883 (default for MQTT)
+    client.connect(broker_address, broker_port)
+
+    # setting callbacks, use separate functions like above for better visibility
+    client.on_subscribe = on_subscribe
+    client.on_message = on_message
+    client.on_publish = on_publish
+
+    # subscribe to all topics of numbers by using the wildcard "#"
+    client.subscribe("numbers/#", qos=args.qos)
+
+    # the network loop runs on its own thread while this one prints the summaries
+    client.loop_start()
+
+    try:
+        # on a step boundary, so every summary covers whole panes and none is skipped
+        next_report = (math.floor(time.time() / step) + 1) * step
+        while True:
+            wait = next_report - time.time()
+            if sink is not None:
+                # wake up often enough that a quiet stream still reaches the disk on time
+                wait = min(wait, args.flush_interval)
+                sink.flush_if_due()
+            time.sleep(max(wait, 0))
+            if time.time() >= next_report:
+                print_summaries(next_report)
+                next_report = (math.floor(next_report / step + 1e-9) + 1) * step
+    except KeyboardInterrupt:
+        client.loop_stop()
+        client.disconnect()
+        if sink is not None:
+            sink.close()
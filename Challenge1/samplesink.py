@@ -0,0 +1,148 @@
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+
+# one record per sample: receive time in ns since the epoch, topic id, value
+RECORD = struct.Struct('<qId')
+TOPICS_FILE = 'topics.json'
+
+
+def segment_name(index):
+    return f"segment-{index:06d}.bin"
+
+
+class SampleSink:
+    def __init__(self, directory: str, flush_bytes: int = 1 << 16, flush_interval: float = 1.0, segment_bytes: int = 1 << 26):
+        """
+            Appends samples to fixed-size binary records, buffered and split over rotating segment files
+            :param directory: where the segments and the topic dictionary are written
+            :param flush_bytes: buffered bytes that trigger a write
+            :param flush_interval: seconds after which buffered records are written even if the buffer is not full
+            :param segment_bytes: size at which a new segment is started
+        """
+        self.directory = directory
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        # rounded down to whole records, so a record never straddles two segments
+        self.segment_bytes = max(segment_bytes - segment_bytes % RECORD.size, RECORD.size)
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.last_flush = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+
+        self.topics = load_topics(directory)
+        existing = sorted(name for name in os.listdir(directory) if name.startswith('segment-'))
+        # never append to a segment from an earlier run, a crash may have left it with a partial record
+        self.segment_index = int(existing[-1][len('segment-'):-len('.bin')]) + 1 if existing else 0
+        self.segment = None
+        self.segment_size = 0
+
+    def topic_id(self, topic):
+        topic_id = self.topics.get(topic)
+        if topic_id is None:
+            topic_id = self.topics[topic] = len(self.topics)
+            # written straight away and replaced atomically, a reader must be able to decode every record on disk
+            path = os.path.join(self.directory, TOPICS_FILE)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(self.topics, f)
+            os.replace(path + '.tmp', path)
+        return topic_id
+
+    def add(self, topic, samples, timestamp_ns=None):
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        with self.lock:
+            topic_id = self.topic_id(topic)
+            for x in samples:
+                self.buffer += RECORD.pack(timestamp_ns, topic_id, x)
+            if len(self.buffer) >= self.flush_bytes:
+                self.flush_locked()
+
+    def flush_if_due(self):
+        with self.lock:
+            if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        offset = 0
+        with memoryview(self.buffer) as view:
+            while offset < len(view):
+                if self.segment is None or self.segment_size >= self.segment_bytes:
+                    self.rotate()
+                end = min(len(view), offset + self.segment_bytes - self.segment_size)
+                self.segment.write(view[offset:end])
+                self.segment_size += end - offset
+                offset = end
+        if self.segment is not None:
+            self.segment.flush()
+        self.buffer.clear()
+        self.last_flush = time.monotonic()
+
+    def rotate(self):
+        if self.segment is not None:
+            self.segment.close()
+        self.segment = open(os.path.join(self.directory, segment_name(self.segment_index)), 'ab')
+        self.segment_index += 1
+        self.segment_size = 0
+
+    def close(self):
+        with self.lock:
+            self.flush_locked()
+            if self.segment is not None:
+                self.segment.close()
+                self.segment = None
+
+
+def load_topics(directory):
+    path = os.path.join(directory, TOPICS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+class SegmentReader:
+    def __init__(self, path: str):
+        """
+            Memory-maps one segment so scans read straight from the page cache without copying the file
+            :param path: segment file written by SampleSink
+        """
+        self.path = path
+        topics = load_topics(os.path.dirname(path) or '.')
+        self.topic_names = {topic_id: topic for topic, topic_id in topics.items()}
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        # ignore a trailing partial record left by a crash mid-write
+        self.size = size - size % RECORD.size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size > 0 else None
+
+    def __len__(self):
+        return self.size // RECORD.size
+
+    def __iter__(self):
+        """
+            Yields (timestamp_ns, topic, value) for every record
+        """
+        if self.map is None:
+            return
+        for offset in range(0, self.size, RECORD.size):
+            timestamp_ns, topic_id, value = RECORD.unpack_from(self.map, offset)
+            yield timestamp_ns, self.topic_names.get(topic_id, topic_id), value
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,195 @@
+import math
+
+
+class QuantileSketch:
+    # relative error of the reported quantiles
+    ACCURACY = 0.01
+    # buckets kept per sign before the smallest magnitudes are folded together
+    MAX_BUCKETS = 1024
+    # magnitudes below this count as zero
+    MIN_VALUE = 1e-9
+
+    def __init__(self):
+        """
+            Approximate quantiles in constant memory by counting values in logarithmic buckets (DDSketch)
+        """
+        self.gamma = (1 + QuantileSketch.ACCURACY) / (1 - QuantileSketch.ACCURACY)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def bucket(self, magnitude):
+        return math.ceil(math.log(magnitude) / self.log_gamma)
+
+    def value(self, bucket):
+        # midpoint of the bucket, within ACCURACY of every value counted in it
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    def add(self, x):
+        self.count += 1
+        if abs(x) < QuantileSketch.MIN_VALUE:
+            self.zeros += 1
+            return
+        buckets = self.positive if x > 0 else self.negative
+        key = self.bucket(abs(x))
+        buckets[key] = buckets.get(key, 0) + 1
+        if len(buckets) > QuantileSketch.MAX_BUCKETS:
+            self.collapse(buckets)
+
+    def collapse(self, buckets):
+        # fold the two smallest magnitudes, which costs accuracy only near zero
+        first, second = sorted(buckets)[:2]
+        buckets[second] += buckets.pop(first)
+
+    def merge(self, other):
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, n in theirs.items():
+                mine[key] = mine.get(key, 0) + n
+            while len(mine) > QuantileSketch.MAX_BUCKETS:
+                self.collapse(mine)
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # walk from the most negative value up to the most positive
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self.value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self.value(key)
+        return self.value(max(self.positive)) if self.positive else 0.0
+
+
+class Pane:
+    def __init__(self, start):
+        """
+            Aggregates of the samples that arrived during one step of a window
+        """
+        self.start = start
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, x):
+        self.count += 1
+        self.total += x
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        self.sketch.add(x)
+
+
+class WindowedStats:
+    PERCENTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, window: float, step: float):
+        """
+            Count, mean, min, max and percentiles over the last window seconds, reported every step seconds
+            A step equal to the window gives tumbling windows, a smaller step gives sliding ones
+            :param window: seconds covered by each summary, rounded to a whole number of steps
+            :param step: seconds between summaries
+        """
+        self.step = step
+        self.panes_per_window = max(1, round(window / step))
+        self.panes: list[Pane] = []
+
+    def pane_index(self, now):
+        # a report scheduled on a step boundary must count as at it, even when now / step rounds to just below
+        return math.floor(now / self.step + 1e-9)
+
+    def add(self, x, now):
+        start = self.pane_index(now) * self.step
+        if not self.panes or self.panes[-1].start != start:
+            self.panes.append(Pane(start))
+            # the panes of the last complete window and the one filling are all that is ever needed,
+            # which keeps memory constant
+            del self.panes[:-(self.panes_per_window + 1)]
+        self.panes[-1].add(x)
+
+    def summary(self, now):
+        """
+            :return: dict of the aggregates over the complete panes of the window ending at now, or None if nothing
+                     arrived in them; the pane still filling is left for the next summary
+        """
+        newest = self.pane_index(now) - 1
+        oldest = newest - self.panes_per_window + 1
+        # starts are computed the same way in add, so they compare exactly
+        panes = [pane for pane in self.panes if oldest * self.step <= pane.start <= newest * self.step]
+        count = sum(pane.count for pane in panes)
+        if count == 0:
+            return None
+        sketch = QuantileSketch()
+        for pane in panes:
+            sketch.merge(pane.sketch)
+        result = {'count': count,
+                  'mean': sum(pane.total for pane in panes) / count,
+                  'min': min(pane.min for pane in panes),
+                  'max': max(pane.max for pane in panes)}
+        for q in WindowedStats.PERCENTILES:
+            result[f'p{round(q * 100)}'] = sketch.quantile(q)
+        return result
+
+
+class DeliveryStats:
+    # sequence numbers this far behind the newest one are no longer waited for
+    REORDER_WINDOW = 4096
+
+    def __init__(self):
+        """
+            Latency, loss, duplicates and reordering for the messages of one publisher
+        """
+        self.latency_ms = QuantileSketch()
+        self.max_latency_ms = -math.inf
+        self.received = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.highest = None
+        # sequence numbers skipped over that may still arrive late
+        self.missing = set()
+        # skipped sequence numbers that fell out of the reorder window without arriving
+        self.lost = 0
+
+    def add(self, seq, sent_ns, received_ns):
+        latency = (received_ns - sent_ns) / 1e6
+        self.latency_ms.add(latency)
+        self.max_latency_ms = max(self.max_latency_ms, latency)
+        self.received += 1
+        if self.highest is None or seq == self.highest + 1:
+            self.highest = seq
+        elif seq > self.highest:
+            self.missing.update(range(max(self.highest + 1, seq - DeliveryStats.REORDER_WINDOW), seq))
+            self.lost += max(seq - DeliveryStats.REORDER_WINDOW - self.highest - 1, 0)
+            self.highest = seq
+        elif seq in self.missing:
+            self.missing.discard(seq)
+            self.reordered += 1
+        else:
+            self.duplicates += 1
+        if len(self.missing) > DeliveryStats.REORDER_WINDOW:
+            oldest = self.highest - DeliveryStats.REORDER_WINDOW
+            expired = [s for s in self.missing if s < oldest]
+            self.missing.difference_update(expired)
+            self.lost += len(expired)
+
+    def summary(self):
+        result = {'received': self.received,
+                  'missing': self.lost + len(self.missing),
+                  'duplicates': self.duplicates,
+                  'reordered': self.reordered}
+        for q in WindowedStats.PERCENTILES:
+            result[f'latency_p{round(q * 100)}_ms'] = self.latency_ms.quantile(q)
+        result['latency_max_ms'] = self.max_latency_ms
+        return result
@@ -0,0 +1,45 @@
+from streamstats import WindowedStats
+
+
+def one_per_second(stats, first, last):
+    for i in range(round(last - first) + 1):
+        stats.add(1.0, first + i)
+
+
+def test_sliding_summary_leaves_out_the_pane_still_filling():
+    stats = WindowedStats(10, 5)
+    one_per_second(stats, 1005.3, 1014.3)
+    # panes [1005, 1010) and [1010, 1015) hold all ten samples, [1015, 1020) has only started
+    assert stats.summary(1015.3)['count'] == 10
+    stats.add(1.0, 1015.3)
+    assert stats.summary(1015.3)['count'] == 10
+
+
+def test_tumbling_summary_covers_the_last_complete_pane():
+    stats = WindowedStats(10, 10)
+    one_per_second(stats, 1005.3, 1014.3)
+    assert stats.summary(1010.0)['count'] == 5
+    assert stats.summary(1015.3)['count'] == 5
+    assert stats.summary(1020.0)['count'] == 5
+    assert stats.summary(1030.0) is None
+
+
+def test_tumbling_reports_on_step_boundaries_count_every_sample_once():
+    stats = WindowedStats(10, 10)
+    reported = 0
+    t = 1000.5
+    for boundary in range(1010, 1100, 10):
+        while t < boundary:
+            stats.add(1.0, t)
+            t += 0.25
+        summary = stats.summary(boundary)
+        reported += summary['count'] if summary is not None else 0
+    assert reported == (1090 - 1000.5) / 0.25
+
+
+def test_boundary_that_divides_to_just_below_a_whole_step_is_at_it():
+    stats = WindowedStats(0.3, 0.1)
+    for i in range(30):
+        stats.add(1.0, 100 + i * 0.01)
+    # 100.3 / 0.1 is 1002.9999999999999 in floating point
+    assert stats.summary(100.3)['count'] == 30
@@ -1,7 +1,7 @@
 import os
 import json
-import copy
-from collections import OrderedDict
+import signal
+import argparse
 
 import paho.mqtt.client as paho
 from paho import mqtt
@@ -9,7 +9,51 @@ from dotenv import load_dotenv
 
 from InputTypes import NewPlayer
 from game import Game
+from lobby import Lobby
+from vision import Vision
+from gameItems import Coin
 from moveset import Moveset
+from profiling import TickProfiler, PROFILE_TOPIC
+from layoutPool import LayoutPool
+from leaderboard import Leaderboard
+from replication import ReplicationPublisher, Standby, REPLICATION_TOPIC, SNAPSHOT_REQUEST_TOPIC, PRIMARY_TOPIC, PRIMARY_KEEPALIVE
+from sequencing import GAME_QOS, SPECTATOR_QOS, parse_move
+from tracing import ALL_IN, RESOLVED, PUBLISHED, LAST_PLAYER, RECEIVED, now_us, move_context, make_properties
+
+# (height, width) of games whose START does not ask for a size, layouts for it are generated ahead of time
+DEFAULT_BOARD_SIZE = (10, 10)
+# the default walls need at least 10 rows and columns, and one start must not tie the server up building a huge map
+MIN_BOARD_SIDE = 10
+# boards from LayoutPool.SPARSE_MIN_CELLS cells up are sparse, so only what is on them costs memory
+MAX_BOARD_SIDE = 5000
+# boards larger than this are not printed to the console
+PRINTED_MAP_CELLS = 400
+# offset masks are cached for every shape and radius ever used, so a START cannot ask for any radius
+MAX_VISION_RADIUS = 10
+
+
+def parse_board_size(text: str) -> tuple[int, int]:
+    """
+        Reads a board size written as HEIGHTxWIDTH, e.g. 20x30
+        :return: (height, width)
+    """
+    try:
+        height, width = (int(side) for side in text.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"board size must be HEIGHTxWIDTH, not {text!r}")
+    if not (MIN_BOARD_SIDE <= height <= MAX_BOARD_SIDE and MIN_BOARD_SIDE <= width <= MAX_BOARD_SIDE):
+        raise ValueError(f"board sides must be between {MIN_BOARD_SIDE} and {MAX_BOARD_SIDE}, not {text!r}")
+    return height, width
+
+
+def parse_vision(text: str) -> Vision:
+    """
+        Reads a vision written as SHAPE:RADIUS[:los], e.g. diamond:3 or circle:4:los
+    """
+    vision = Vision.parse(text)
+    if vision.radius > MAX_VISION_RADIUS:
+        raise ValueError(f"vision radius must be at most {MAX_VISION_RADIUS}, not {text!r}")
+    return vision
 
 # setting callbacks for different events to see if it works, print the message etc.
 def on_connect(client, userdata, flags, rc, properties=None):
@@ -22,6 +66,22 @@ def on_connect(client, userdata, flags, rc, properties=None):
         :param properties: can be used in MQTTv5, but is optional
     """
     print("CONNACK received with code %s." % rc)
+    # subscriptions end with the session, so they are made again on every connect
+    client.subscribe(PROFILE_TOPIC, qos=2)
+    if client.standby is not None:
+        client.subscribe(REPLICATION_TOPIC, qos=GAME_QOS)
+        client.subscribe(PRIMARY_TOPIC, qos=GAME_QOS)
+        return
+    subscribe_to_games(client)
+    if client.replicator.enabled:
+        client.subscribe(SNAPSHOT_REQUEST_TOPIC, qos=GAME_QOS)
+    client.publish(PRIMARY_TOPIC, 'online', qos=1, retain=True)
+    # moves sent while this server was not connected are lost, players resend them when a state
+    # they already answered comes again, and make them when it is one they have not seen
+    for lobby in client.lobbies.values():
+        if lobby.started:
+            for player in lobby.game.all_players.keys():
+                publish_game_state(client, lobby, player)
 
 
 # with this callback you can see if your publish was successful
@@ -60,14 +120,38 @@ def on_message(client, userdata, msg):
     print("message: " + msg.topic + " " + str(msg.qos) + " " + str(msg.payload))
     topic_list = msg.topic.split("/")
 
+    if msg.topic == REPLICATION_TOPIC and client.standby is not None:
+        behind = client.standby.apply(json.loads(msg.payload))
+        if behind is not None:
+            client.publish(SNAPSHOT_REQUEST_TOPIC, behind, qos=GAME_QOS)
+        return
+    if msg.topic == SNAPSHOT_REQUEST_TOPIC:
+        lobby = client.lobbies.get(msg.payload.decode())
+        if lobby is not None and lobby.started:
+            client.replicator.snapshot(lobby)
+        return
+    if msg.topic == PRIMARY_TOPIC:
+        if client.standby is not None and msg.payload.decode() in ('offline', 'handover'):
+            promote(client)
+        return
+
+    if msg.topic == PROFILE_TOPIC:
+        try:
+            client.profiler.command(json.loads(msg.payload))
+        except (ValueError, TypeError, AttributeError):
+            print("Invalid profiling request")
+        return
+
     # Validate it is input we can deal with
     if topic_list[-1] in dispatch.keys(): 
-        dispatch[topic_list[-1]](client, topic_list, msg.payload)
+        lobby_name = topic_list[1] if topic_list[0] == 'games' else None
+        with client.profiler.profile(lobby_name):
+            dispatch[topic_list[-1]](client, topic_list, msg.payload, msg.properties)
 
 
 
 # Dispatched function, adds player to a lobby & team
-def add_player(client, topic_list, msg_payload):
+def add_player(client, topic_list, msg_payload, properties=None):
     # Parse and Validate Input Data
     try:
         player = NewPlayer(**json.loads(msg_payload))
@@ -76,26 +160,24 @@ def add_player(client, topic_list, msg_payload):
         return
     
     # If lobby doesn't exists...
-    if player.lobby_name not in client.team_dict.keys():
-        client.team_dict[player.lobby_name] = {}
-        client.team_dict[player.lobby_name]['started'] = False
+    if player.lobby_name not in client.lobbies:
+        client.lobbies[player.lobby_name] = Lobby(player.lobby_name)
+    lobby = client.lobbies[player.lobby_name]
+
+    # a join delivered twice registers the player once
+    if player.player_name in lobby.slots:
+        return
 
-    if client.team_dict[player.lobby_name]['started']:
+    if lobby.started:
         publish_error_to_lobby(client, player.lobby_name, "Game has already started, please make a new lobby")
+        return
 
-    add_team(client, player)
+    lobby.add_player(player.team_name, player.player_name)
+    client.replicator.player_added(player.lobby_name, player.team_name, player.player_name)
 
     print(f'Added Player: {player.player_name} to Team: {player.team_name}')
 
 
-def add_team(client, player):
-    # If team not in lobby, make new team and start a player list for the team
-    if player.team_name not in client.team_dict[player.lobby_name].keys():
-        client.team_dict[player.lobby_name][player.team_name] = [player.player_name,]    
-    # If team already exists, add player to existing list
-    else:
-        client.team_dict[player.lobby_name][player.team_name].append(player.player_name)
-
 move_to_Moveset = {
     'UP' : Moveset.UP,
     'DOWN' : Moveset.DOWN,
@@ -104,35 +186,59 @@ move_to_Moveset = {
 }
 
 # Dispatched Function: handles player movement commands
-def player_move(client, topic_list, msg_payload):
+def player_move(client, topic_list, msg_payload, properties=None):
+    received = now_us()
     lobby_name = topic_list[1]
     player_name = topic_list[2]
-    if lobby_name in client.team_dict.keys():
+    lobby: Lobby = client.lobbies.get(lobby_name)
+    if lobby is not None:
+        # a move redelivered after the game ended, or sent before it started
+        if not lobby.started:
+            return
         try:
-            new_move = msg_payload.decode()
+            new_move, tick = parse_move(msg_payload)
+            game: Game = lobby.game
 
-            client.move_dict[lobby_name][player_name] = (player_name, move_to_Moveset[new_move])
-            game: Game = client.game_dict[lobby_name]
+            # a move answering an older state arrived late or twice, and clients that number moves are ignored
+            # when they answer any state but the current one; the first move of a player in a tick is the one kept
+            if tick is not None and tick != lobby.tick:
+                return
+            if not lobby.set_move(player_name, move_to_Moveset[new_move], move_context(properties, received)):
+                return
 
             # If all players made a move, resolve movement
-            if len(game.all_players) == len(client.move_dict[lobby_name]):
-                for player, move in client.move_dict[lobby_name].values():
-                    game.movePlayer(player, move)
-
-                # Publish player states after all movement is resolved
-                for player, _ in client.move_dict[lobby_name].values():
-                    client.publish(f'games/{lobby_name}/{player}/game_state', json.dumps(game.getGameData(player)), qos=2)
-
-                # Clear move list
-                client.move_dict[lobby_name].clear()
-                print(game.map)
-                client.publish(f'games/{lobby_name}/scores', json.dumps(game.getScores()), qos=2)
+            if lobby.all_moved():
+                all_in = now_us()
+                moves, traces = lobby.take_moves()
+                for player, move in moves:
+                    record = game.movePlayer(player, move)
+                    # a move that picked up a coin is the only way a score changes
+                    if record is not None and isinstance(record[2], Coin):
+                        client.leaderboard.add(lobby_name, record[0].team.name, record[2].value)
+                lobby.tick += 1
+                client.replicator.tick(lobby, moves)
+                resolved = now_us()
+
+                # Publish player states after all movement is resolved, each echoing the trace of the player's move
+                # with the server's times for the tick, so players see where their wait went
+                timing = {ALL_IN: all_in, RESOLVED: resolved, LAST_PLAYER: moves[-1][0]}
+                for player, _ in moves:
+                    publish_game_state(client, lobby, player, {**traces.get(player, {}), **timing})
+                if client.tick_timing:
+                    published = now_us()
+                    first_in = min(trace[RECEIVED] for trace in traces.values())
+                    print(f"Tick {lobby.tick} of {lobby_name}: waited {(all_in - first_in) / 1000:.1f}ms for {moves[-1][0]}, "
+                          f"resolved in {(resolved - all_in) / 1000:.1f}ms, published in {(published - resolved) / 1000:.1f}ms")
+
+                print_map(game)
+                client.publish(f'games/{lobby_name}/scores', json.dumps(game.getScores()), qos=SPECTATOR_QOS)
                 if game.gameOver():
                     # Publish game over, remove game
                     publish_to_lobby(client, lobby_name, "Game Over: All coins have been collected")
-                    client.team_dict.pop(lobby_name)
-                    client.move_dict.pop(lobby_name)
-                    client.game_dict.pop(lobby_name)
+                    client.lobbies.pop(lobby_name)
+                    client.leaderboard.end_lobby(lobby_name)
+                    client.replicator.game_ended(lobby_name)
+                client.leaderboard.publish_if_due(client)
 
         except Exception as e:
             raise e
@@ -142,30 +248,94 @@ def player_move(client, topic_list, msg_payload):
 
 
 # Dispatched function: Instantiates Game object
-def start_game(client, topic_list, msg_payload):
+def start_game(client, topic_list, msg_payload, properties=None):
     lobby_name = topic_list[1]
-    if isinstance(msg_payload, bytes) and msg_payload.decode() == "START":
+    words = msg_payload.decode().split() if isinstance(msg_payload, bytes) else []
+    if words[:1] == ["START"]:
+
+        lobby: Lobby = client.lobbies.get(lobby_name)
+        # a START delivered twice must not restart the game
+        if lobby is not None and not lobby.started:
+                # "START 20x30 circle:4:los" asks for a board size and a vision, either one left out gets the
+                # server's default
+                (height, width), vision = client.board_size, client.vision
+                try:
+                    for option in words[1:]:
+                        if ':' in option:
+                            vision = parse_vision(option)
+                        else:
+                            height, width = parse_board_size(option)
+                except ValueError as e:
+                    publish_error_to_lobby(client, lobby_name, str(e))
+                    return
+                # the map comes ready-made from the pool, only the players are placed here
+                game = Game(lobby.teams, width, height, layout=client.layout_pool.take(height, width))
+                # before the map info goes out, clients learn from it which cells their game states cover
+                game.setVision(vision)
+                lobby.start(game)
+                for team in game.teams.keys():
+                    client.leaderboard.add(lobby_name, team, 0)
+                client.replicator.game_started(lobby)
+
+                # clients size their maps from this before the first game state arrives,
+                # and learn which cells a game state covers from the vision settings
+                # the layout hash names the walls the same way in every process, for tools that keep distance tables
+                map_info = {'height' : game.height, 'width' : game.width, 'vision' : game.vision.toDict(),
+                            'playerVision' : {name : vision.toDict() for name, vision in game.playerVisions.items()},
+                            'layout' : game.map.layoutHash}
+                client.publish(f'games/{lobby_name}/map', json.dumps(map_info), qos=GAME_QOS)
+                for player in game.all_players.keys():
+                    publish_game_state(client, lobby, player)
 
-        if lobby_name in client.team_dict.keys():
-                # create new game
-                dict_copy = copy.deepcopy(client.team_dict[lobby_name])
-                dict_copy.pop('started')
 
-                game = Game(dict_copy)
-                client.game_dict[lobby_name] = game
-                client.move_dict[lobby_name] = OrderedDict()
-                client.team_dict[lobby_name]["started"] = True
+                print_map(game)
+    elif words == ["STOP"]:
+        publish_to_lobby(client, lobby_name, "Game Over: Game has been stopped")
+        client.lobbies.pop(lobby_name, None)
+        client.leaderboard.end_lobby(lobby_name)
+        client.leaderboard.publish_if_due(client)
+        client.replicator.game_ended(lobby_name)
 
-                for player in game.all_players.keys():
-                    client.publish(f'games/{lobby_name}/{player}/game_state', json.dumps(game.getGameData(player)), qos=2)
 
+def print_map(game: Game):
+    # a whole board is only readable, and cheap enough to format every tick, while it is small
+    if game.height * game.width <= PRINTED_MAP_CELLS:
+        print(game.map)
 
-                print(game.map)
-    elif isinstance(msg_payload, bytes) and msg_payload.decode() == "STOP":
-        publish_to_lobby(client, lobby_name, "Game Over: Game has been stopped")
-        client.team_dict.pop(lobby_name, None)
-        client.move_dict.pop(lobby_name, None)
-        client.game_dict.pop(lobby_name, None)
+
+def publish_game_state(client, lobby: Lobby, player, trace=None):
+    # the tick tells players a new state from a redelivered one, and is echoed back with their move, the epoch tells
+    # them the server was taken over and counts ticks anew
+    game_state = lobby.game.getGameData(player)
+    game_state['tick'] = lobby.tick
+    game_state['epoch'] = lobby.epoch
+    payload = json.dumps(game_state)
+    # stamped last, so the player's own state counts towards the server's time
+    properties = None if trace is None else make_properties({**trace, PUBLISHED: now_us()})
+    client.publish(f'games/{lobby.name}/{player}/game_state', payload, qos=GAME_QOS, properties=properties)
+
+
+def subscribe_to_games(client):
+    client.subscribe("new_game", qos=GAME_QOS)
+    client.subscribe('games/+/start', qos=GAME_QOS)
+    client.subscribe('games/+/+/move', qos=GAME_QOS)
+
+
+def promote(client):
+    """
+        Turns a standby into the primary, serving every lobby from the replicas it kept
+        The standby connected without a will, so it disconnects here and the main loop connects it again with one,
+        on_connect then subscribes to the games and sends every player their state
+    """
+    standby, client.standby = client.standby, None
+    standby.take_over(client)
+    running = [lobby for lobby in client.lobbies.values() if lobby.started]
+    print(f"Took over {len(running)} running games")
+    for lobby in running:
+        for team_name, team in lobby.game.teams.items():
+            client.leaderboard.add(lobby.name, team_name, team.score)
+    client.reconnect_as_primary = True
+    client.disconnect()
 
 
 def publish_error_to_lobby(client, lobby_name, error):
@@ -173,7 +343,7 @@ def publish_error_to_lobby(client, lobby_name, error):
 
 
 def publish_to_lobby(client, lobby_name, msg):
-    client.publish(f"games/{lobby_name}/lobby", msg, qos=2)
+    client.publish(f"games/{lobby_name}/lobby", msg, qos=GAME_QOS)
 
 
 dispatch = {
@@ -184,6 +354,14 @@ dispatch = {
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Game server")
+    parser.add_argument('--standby', action='store_true', help="keep replicas of the primary's games and take over when it goes away")
+    parser.add_argument('--replicate', action='store_true', help="stream every game to a standby, which costs a publish per tick and a snapshot every few")
+    parser.add_argument('--tick-timing', action='store_true', help="print how long every tick waited for moves, took to resolve and to publish")
+    parser.add_argument('--board-size', type=parse_board_size, default=DEFAULT_BOARD_SIZE, help="HEIGHTxWIDTH of games whose START does not ask for a size")
+    parser.add_argument('--vision', type=parse_vision, default=Vision(), help="SHAPE:RADIUS[:los] players see with when START does not ask, SHAPE is square, diamond or circle")
+    args = parser.parse_args()
+
     load_dotenv(dotenv_path='./credentials.env')
     
     broker_address = os.environ.get('BROKER_ADDRESS')
@@ -191,27 +369,53 @@ if __name__ == '__main__':
     username = os.environ.get('USER_NAME')
     password = os.environ.get('PASSWORD')
 
-    client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id="GameClient", userdata=None, protocol=paho.MQTTv5)
+    # both run at the same time, and the broker would disconnect one of two clients with the same id
+    client_id = "GameClient-standby" if args.standby else "GameClient"
+    client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id=client_id, userdata=None, protocol=paho.MQTTv5)
     
     # enable TLS for secure connection
     client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
     # set username and password
     client.username_pw_set(username, password)
+    if not args.standby:
+        # tells the standby when this process dies without disconnecting
+        client.will_set(PRIMARY_TOPIC, 'offline', qos=1, retain=True)
     # connect to HiveMQ Cloud on port 8883 (default for MQTT)
-    client.connect(broker_address, broker_port)
+    client.connect(broker_address, broker_port, keepalive=PRIMARY_KEEPALIVE)
 
     # setting callbacks, use separate functions like above for better visibility
+    client.on_connect = on_connect
     client.on_subscribe = on_subscribe # Can comment out to not print when subscribing to new topics
     client.on_message = on_message
     client.on_publish = on_publish # Can comment out to not print when publishing to topics
     
     # custom dictionary to track players
-    client.team_dict = {} # Keeps tracks of players before a game starts {'lobby_name' : {'team_name' : [player_name, ...]}}
-    client.game_dict = {} # Keeps track of the games {{'lobby_name' : Game Object}
-    client.move_dict = {} # Keeps track of the games {{'lobby_name' : Game Object}
-
-    client.subscribe("new_game", qos=2)
-    client.subscribe('games/+/start', qos=2)
-    client.subscribe('games/+/+/move', qos=2)
+    client.lobbies = {} # Roster, game and pending moves of every lobby {'lobby_name' : Lobby}
+    client.board_size = args.board_size
+    client.vision = args.vision
+    client.tick_timing = args.tick_timing
+    # sizes asked for in START are added to the pool the first time they are requested
+    client.layout_pool = LayoutPool([client.board_size])
+    client.leaderboard = Leaderboard() # Live top teams over all lobbies, published to 'leaderboard'
+    # off until asked for on the admin topic or with SIGUSR1
+    client.profiler = TickProfiler()
+    client.profiler.install_signal_handler()
+    # a standby only has games to take over from a primary started with --replicate
+    client.replicator = ReplicationPublisher(client, enabled=args.replicate)
+    client.standby = Standby() if args.standby else None
+    client.reconnect_as_primary = False
+
+    def hand_over(signum, frame):
+        # for upgrades: a clean disconnect does not send the will, so the standby is told directly
+        if client.standby is None:
+            client.publish(PRIMARY_TOPIC, 'handover', qos=1, retain=True)
+        client.disconnect()
+    signal.signal(signal.SIGTERM, hand_over)
 
     client.loop_forever()
+    while client.reconnect_as_primary:
+        client.reconnect_as_primary = False
+        # tells the next standby when this process dies, as the primary it replaced did
+        client.will_set(PRIMARY_TOPIC, 'offline', qos=1, retain=True)
+        client.connect(broker_address, broker_port, keepalive=PRIMARY_KEEPALIVE)
+        client.loop_forever()
@@ -0,0 +1,209 @@
+import os
+import json
+import argparse
+import threading
+from dotenv import load_dotenv
+
+import paho.mqtt.client as paho
+from paho import mqtt
+import time
+
+from policies import POLICIES, Policy, PolicyRunner, make_policy
+from coordination import TeamCoordinator, intents_topic
+from vision import Vision
+from sequencing import GAME_QOS, NEW, REPEAT, StateSequencer, move_payload, start_payload
+from tracing import now_us, new_trace_id, move_properties, read_context, breakdown, format_breakdown
+
+# seconds all pending bots may spend choosing their moves in one batch, split between them
+BATCH_BUDGET = 0.2
+# how often the host checks for bots that received a new game state
+TICK_INTERVAL = 0.05
+
+
+class BotHost:
+    def __init__(self, lobby_name: str, coordinate: bool = False, policy: str = 'planner'):
+        """
+            Runs many bots for one lobby over a single MQTT connection
+            :param lobby_name: lobby every hosted bot joins
+            :param coordinate: split coins between teammates over the team intents topics
+            :param policy: name of the registered policy every bot plays with
+        """
+        self.lobby_name = lobby_name
+        self.coordinate = coordinate
+        self.policy = policy
+        self.bots: dict[str, Policy] = {}
+        # every bot decides on its own worker, which also applies the map, vision and intent updates for it
+        self.runners: dict[str, PolicyRunner] = {}
+        self.teams: dict[str, str] = {}
+        self.sequencers: dict[str, StateSequencer] = {}
+        # latest game state of every bot that still owes a move, filled by the paho thread
+        self.pending: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.game_running = False
+        # batches decided so far, rotates which bots go first
+        self.batches = 0
+
+    def add_bot(self, player_name: str, team_name: str):
+        self.bots[player_name] = make_policy(self.policy, player_name)
+        self.runners[player_name] = PolicyRunner(self.bots[player_name])
+        self.teams[player_name] = team_name
+        self.sequencers[player_name] = StateSequencer()
+        if self.coordinate:
+            self.bots[player_name].coordinator = TeamCoordinator(player_name)
+
+    def on_message(self, client, userdata, msg):
+        """
+            Routes game states to the bot named in the topic and tracks the lobby status ( used as callback for subscribe )
+            :param client: the client itself
+            :param userdata: userdata is set when initiating the client, here it is userdata=None
+            :param msg: the message with topic and payload
+        """
+        topic_list = msg.topic.split("/")
+        if topic_list[-1] == 'game_state':
+            bot = self.bots.get(topic_list[2])
+            if bot is None:
+                return
+            arrived = now_us()
+            game_state = json.loads(msg.payload.decode())
+            with self.lock:
+                sequencer = self.sequencers[bot.player_name]
+                status = sequencer.receive(game_state)
+                if status == NEW:
+                    self.pending[bot.player_name] = game_state
+                # the bot's move for a state that came again may not have arrived, sending it twice is harmless
+                sent = sequencer.resend() if status == REPEAT else None
+            if status == NEW:
+                times = breakdown(read_context(msg.properties), arrived)
+                if times is not None:
+                    print(f"{bot.player_name} round trip", format_breakdown(times))
+            if sent is not None:
+                payload, trace_id = sent
+                properties = None if trace_id is None else move_properties(trace_id)
+                client.publish(f"games/{self.lobby_name}/{bot.player_name}/move", payload, qos=GAME_QOS, properties=properties)
+        elif topic_list[-1] == 'intents':
+            for name, bot in self.bots.items():
+                if self.teams[name] == topic_list[3]:
+                    self.runners[name].call(bot.coordinator.receive, msg.payload)
+        elif topic_list[-1] == 'map':
+            map_info = json.loads(msg.payload.decode())
+            for name, bot in self.bots.items():
+                self.runners[name].call(bot.set_dimensions, map_info["height"], map_info["width"])
+                self.runners[name].call(bot.set_vision, Vision.fromMapInfo(map_info, bot.player_name))
+        elif topic_list[-1] == 'start' and msg.payload.decode().split(' ')[0] == 'START':
+            self.game_running = True
+        elif topic_list[-1] == 'lobby':
+            payload = msg.payload.decode()
+            print("lobby: " + payload)
+            if payload.startswith('Game Over') or 'Error' in payload:
+                self.game_running = False
+
+    def join(self, client):
+        client.subscribe(f"games/{self.lobby_name}/lobby", qos=GAME_QOS)
+        client.subscribe(f'games/{self.lobby_name}/+/game_state', qos=GAME_QOS)
+        client.subscribe(f'games/{self.lobby_name}/start', qos=GAME_QOS)
+        client.subscribe(f'games/{self.lobby_name}/map', qos=GAME_QOS)
+        if self.coordinate:
+            client.subscribe(intents_topic(self.lobby_name, '+'), qos=0)
+        for player_name, team_name in self.teams.items():
+            client.publish("new_game", json.dumps({'lobby_name' : self.lobby_name,
+                                                   'team_name' : team_name,
+                                                   'player_name' : player_name}), qos=GAME_QOS)
+
+    def decide_batch(self):
+        """
+            Decides a move for every bot with a fresh game state, each bot gets an equal share of the time left
+            so one slow bot cannot leave the others with nothing, and time a bot does not use goes to the ones after it
+            :return: list of (player_name, move payload, trace id, intent payload or None)
+        """
+        with self.lock:
+            ready, self.pending = self.pending, {}
+        # the bots that go last get the least leftover time, so that is not always the same ones
+        order = list(ready.items())
+        if order:
+            first = self.batches % len(order)
+            order = order[first:] + order[:first]
+        self.batches += 1
+        deadline = time.perf_counter() + BATCH_BUDGET
+        moves = []
+        for left, (name, game_state) in zip(range(len(order), 0, -1), order):
+            bot = self.bots[name]
+            # a bot's distance table only changes when it sees a new wall or explores into a new chunk, so most
+            # decisions reuse rows built on earlier ticks; bots only share a table when they know the same walls
+            runner = self.runners[name]
+            remaining = deadline - time.perf_counter()
+            if remaining > 0:
+                move = runner.decide(game_state, remaining / left)
+            else:
+                move = bot.quick_move(game_state)
+            payload = move_payload(move.name, game_state.get('tick'))
+            trace_id = new_trace_id()
+            with self.lock:
+                self.sequencers[name].record(game_state.get('tick'), payload, trace_id)
+            moves.append((name, payload, trace_id, runner.intent_payload() if self.coordinate else None))
+        return moves
+
+    def run(self, client):
+        while not self.game_running:
+            time.sleep(TICK_INTERVAL)
+        while self.game_running:
+            for player_name, move, trace_id, intent in self.decide_batch():
+                client.publish(f"games/{self.lobby_name}/{player_name}/move", move, qos=GAME_QOS, properties=move_properties(trace_id))
+                if intent is not None:
+                    client.publish(intents_topic(self.lobby_name, self.teams[player_name]), intent, qos=0)
+            time.sleep(TICK_INTERVAL)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Host many AI players in one process")
+    parser.add_argument('lobby_name')
+    parser.add_argument('--bots', type=int, default=4, help="number of bots to run")
+    parser.add_argument('--teams', type=int, default=2, help="bots are dealt round robin onto this many teams")
+    parser.add_argument('--prefix', default='bot', help="prefix for bot player and team names")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='planner', help="how the bots decide their moves")
+    parser.add_argument('--coordinate', action='store_true', help="split coins between teammates")
+    parser.add_argument('--start', action='store_true', help="start the game once every bot has joined")
+    parser.add_argument('--board-size', help="HEIGHTxWIDTH to ask for with --start, the server's default if left out")
+    parser.add_argument('--vision', help="SHAPE:RADIUS[:los] to ask for with --start, the server's default if left out")
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path='./credentials.env')
+
+    broker_address = os.environ.get('BROKER_ADDRESS')
+    broker_port = int(os.environ.get('BROKER_PORT'))
+    username = os.environ.get('USER_NAME')
+    password = os.environ.get('PASSWORD')
+
+    host = BotHost(args.lobby_name, args.coordinate, args.policy)
+    for i in range(args.bots):
+        host.add_bot(f"{args.prefix}{i}", f"{args.prefix}-team{i % args.teams}")
+
+    client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id=f"{args.prefix}-host-{args.lobby_name}", userdata=None, protocol=paho.MQTTv5)
+
+    # enable TLS for secure connection
+    client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
+    # set username and password
+    client.username_pw_set(username, password)
+    # connect to HiveMQ Cloud on port 8883 (default for MQTT)
+    client.connect(broker_address, broker_port)
+
+    client.on_message = host.on_message
+
+    client.loop_start()
+
+    host.join(client)
+    time.sleep(1)
+
+    if args.start:
+        client.publish(f"games/{args.lobby_name}/start", start_payload(args.board_size, args.vision), qos=GAME_QOS)
+    else:
+        print("Waiting for game to start...")
+
+    host.run(client)
+
+    if args.start:
+        client.publish(f"games/{args.lobby_name}/start", "STOP", qos=GAME_QOS)
+        time.sleep(1)
+
+    print("Game has ended!")
+
+    client.loop_stop()
@@ -1,15 +1,28 @@
 import os
 import json
+import argparse
 from dotenv import load_dotenv
 
 import paho.mqtt.client as paho
 from paho import mqtt
 import time
 
+from chunkedGrid import ChunkedGrid
+from renderer import TerminalRenderer
+from vision import Vision
+from sequencing import GAME_QOS, SPECTATOR_QOS, NEW, REPEAT, StateSequencer, move_payload, start_payload
+from tracing import now_us, new_trace_id, move_properties, read_context, breakdown, format_breakdown
+
 game_running = False
 next_move = False
 game_state = None
-game_map = [["None" for i in range(10)] for j in range(10)]
+sequencer = StateSequencer()
+# replaced once the server announces the board size, only tiles that were seen get allocated
+game_map = ChunkedGrid(10, 10, "None")
+# set when the board is drawn in place instead of printed every turn
+renderer = None
+# cells a game state covers, as announced by the server at game start
+vision = Vision()
 moves = {
     "W" : "UP",
     "A" : "LEFT",
@@ -63,20 +76,44 @@ def on_message(client, userdata, msg):
         :param userdata: userdata is set when initiating the client, here it is userdata=None
         :param msg: the message with topic and payload
     """
-    print("message: " + msg.topic + " " + str(msg.qos) + " " + str(msg.payload))
+    if renderer is None:
+        print("message: " + msg.topic + " " + str(msg.qos) + " " + str(msg.payload))
     global game_running
     global next_move
     global game_state
+    global game_map
+    global vision
     if 'Error' in msg.payload.decode():
         next_move = True
         game_running = False
     if msg.topic.endswith('/lobby') and msg.payload.decode() == 'Game Over: All coins have been collected':
         game_running = False
     elif msg.topic.endswith('/game_state'):
-        next_move = True
-        game_state = json.loads(msg.payload.decode())
-    elif msg.topic.endswith('/start') and msg.payload.decode() == 'START':
+        arrived = now_us()
+        state = json.loads(msg.payload.decode())
+        status = sequencer.receive(state)
+        if status == NEW:
+            next_move = True
+            game_state = state
+            times = breakdown(read_context(msg.properties), arrived)
+            if times is not None and renderer is None:
+                print("Round trip", format_breakdown(times))
+        elif status == REPEAT:
+            # redelivered, or sent again by a server that took over, the move made for it may not have arrived
+            sent = sequencer.resend()
+            if sent is not None:
+                payload, trace_id = sent
+                properties = None if trace_id is None else move_properties(trace_id)
+                client.publish(msg.topic[:-len('game_state')] + 'move', payload, qos=GAME_QOS, properties=properties)
+    elif msg.topic.endswith('/start') and msg.payload.decode().split(' ')[0] == 'START':
         game_running = True
+    elif msg.topic.endswith('/map'):
+        map_info = json.loads(msg.payload.decode())
+        game_map = ChunkedGrid(map_info["height"], map_info["width"], "None")
+        # player_name is set by the prompt before the client connects
+        vision = Vision.fromMapInfo(map_info, player_name)
+    elif msg.topic.endswith('/scores') and renderer is not None:
+        renderer.set_scores(json.loads(msg.payload.decode()))
 
 def lobby_prompt():
     print("Welcome to the Tech Assignment 1 Game as a Player!")
@@ -110,48 +147,59 @@ def move_prompt():
         option = input("Enter your selection: ").upper()
     return option
     
-def print_map():
-    for i in range(len(game_map)):
+def print_map(view_radius=5):
+    # print the part of the board around the player, the whole board can be far larger than a terminal
+    player_x, player_y = game_state["currentPosition"]
+    for i in range(max(player_x - view_radius, 0), min(player_x + view_radius, game_map.height - 1) + 1):
         row = ""
-        for j in range(len(game_map[0])):
-            row += game_map[i][j] + "\t"
+        for j in range(max(player_y - view_radius, 0), min(player_y + view_radius, game_map.width - 1) + 1):
+            row += game_map.get((i, j)) + "\t"
         print(row)
 
 def construct_map(player_name: str):
-    # how far the player can see on the map at any given time
-    vision_radius = 2
     # get game position info
     player_pos = game_state["currentPosition"]
-    # calculate coordinates near player
     player_x, player_y = player_pos[0], player_pos[1]
-    min_x = max(player_x - vision_radius, 0)
-    max_x = min(player_x + vision_radius, 10)
-    min_y = max(player_y - vision_radius, 0)
-    max_y = min(player_y + vision_radius, 10)
-    # reset space near player
-    for x in range(min_x, max_x):
-        for y in range(min_y, max_y):
-            game_map[x][y] = "None"
+    # reset the cells the player can see, behind walls seen now or before if the server hides those
+    walls_now = set(tuple(pos) for pos in game_state["walls"])
+    window = {}
+    for loc in vision.visibleCells((player_x, player_y), game_map.height, game_map.width,
+                                   lambda loc: loc in walls_now or game_map.get(loc) == "Wall"):
+        window[loc] = "None"
     # place players
-    game_map[player_x][player_y] = player_name
+    window[(player_x, player_y)] = player_name
     for i in range(len(game_state["teammatePositions"])):
          teamate_name = game_state["teammateNames"][i]
          pos = game_state["teammatePositions"][i]
-         game_map[pos[0]][pos[1]] = teamate_name
+         window[(pos[0], pos[1])] = teamate_name
     for pos in game_state["enemyPositions"]:
-         game_map[pos[0]][pos[1]] = "Enemy"
+         window[(pos[0], pos[1])] = "Enemy"
     # place obstacles
     for pos in game_state["walls"]:
-        game_map[pos[0]][pos[1]] = "Wall"
+        window[(pos[0], pos[1])] = "Wall"
     # place coins
     for pos in game_state["coin1"]:
-        game_map[pos[0]][pos[1]] = "Coin1"
+        window[(pos[0], pos[1])] = "Coin1"
     for pos in game_state["coin2"]:
-        game_map[pos[0]][pos[1]] = "Coin2"
+        window[(pos[0], pos[1])] = "Coin2"
     for pos in game_state["coin3"]:
-        game_map[pos[0]][pos[1]] = "Coin3"
+        window[(pos[0], pos[1])] = "Coin3"
+    # only write cells that changed, so the renderer only redraws those
+    for loc, value in window.items():
+        if game_map.get(loc) != value:
+            game_map.set(loc, value)
+            if renderer is not None:
+                renderer.mark(loc)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play the game from the terminal")
+    parser.add_argument('--render', action='store_true', help="redraw the board in place with a live score bar instead of printing it every turn")
+    parser.add_argument('--board-size', help="HEIGHTxWIDTH to ask for when creating the lobby, the server's default if left out")
+    parser.add_argument('--vision', help="SHAPE:RADIUS[:los] to ask for when creating the lobby, the server's default if left out")
+    args = parser.parse_args()
+    if args.render:
+        renderer = TerminalRenderer()
+
     load_dotenv(dotenv_path='./credentials.env')
     
     broker_address = os.environ.get('BROKER_ADDRESS')
@@ -171,26 +219,29 @@ if __name__ == '__main__':
     client.connect(broker_address, broker_port)
 
     # setting callbacks, use separate functions like above for better visibility
-    client.on_subscribe = on_subscribe # Can comment out to not print when subscribing to new topics
     client.on_message = on_message
-    client.on_publish = on_publish # Can comment out to not print when publishing to topics
+    # the renderer owns the screen, so skip the per-message logging
+    if renderer is None:
+        client.on_subscribe = on_subscribe # Can comment out to not print when subscribing to new topics
+        client.on_publish = on_publish # Can comment out to not print when publishing to topics
 
     client.loop_start()
 
-    client.subscribe(f"games/{lobby_name}/lobby", qos=2)
-    client.subscribe(f'games/{lobby_name}/{player_name}/game_state', qos=2)
-    client.subscribe(f'games/{lobby_name}/scores', qos=2)
-    client.subscribe(f'games/{lobby_name}/start', qos=2)
+    client.subscribe(f"games/{lobby_name}/lobby", qos=GAME_QOS)
+    client.subscribe(f'games/{lobby_name}/{player_name}/game_state', qos=GAME_QOS)
+    client.subscribe(f'games/{lobby_name}/scores', qos=SPECTATOR_QOS)
+    client.subscribe(f'games/{lobby_name}/start', qos=GAME_QOS)
+    client.subscribe(f'games/{lobby_name}/map', qos=GAME_QOS)
 
     client.publish("new_game", json.dumps({'lobby_name' : lobby_name,
                                            'team_name' : team_name,
-                                           'player_name' : player_name}), qos=2)
+                                           'player_name' : player_name}), qos=GAME_QOS)
     time.sleep(1)
 
     if creating_lobby:
         print("Waiting for other players to join...")
         input("Press enter to start the game: ")
-        client.publish(f"games/{lobby_name}/start", "START", qos=2)
+        client.publish(f"games/{lobby_name}/start", start_payload(args.board_size, args.vision), qos=GAME_QOS)
         time.sleep(1)
     else:
         print("Waiting for game to start...")
@@ -204,16 +255,23 @@ if __name__ == '__main__':
         time.sleep(0.5) # Wait for subsequent messages
         if not game_running:
             break
+        tick = game_state.get('tick')
         construct_map(player_name)
-        print_map()
+        if renderer is not None:
+            renderer.draw(game_map, game_state["currentPosition"])
+        else:
+            print_map()
         m = move_prompt()
         next_move = False
-        client.publish(f"games/{lobby_name}/{player_name}/move", moves[m], qos=2)
+        payload = move_payload(moves[m], tick)
+        trace_id = new_trace_id()
+        sequencer.record(tick, payload, trace_id)
+        client.publish(f"games/{lobby_name}/{player_name}/move", payload, qos=GAME_QOS, properties=move_properties(trace_id))
         time.sleep(0.5)
         print("Waiting for all players to make a move...")
 
     if creating_lobby:
-        client.publish(f"games/{lobby_name}/start", "STOP", qos=2)
+        client.publish(f"games/{lobby_name}/start", "STOP", qos=GAME_QOS)
         time.sleep(1)
 
     print("Game has ended!")
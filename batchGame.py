@@ -0,0 +1,215 @@
+import random
+import numpy as np
+
+from game import Game
+from gameItems import Wall, Coin1, Coin2, Coin3
+from moveset import Moveset
+from player import Player
+
+# cell codes in the grid, a player p is stored as PLAYER + p
+EMPTY = 0
+WALL = 1
+COIN1 = 2
+COIN2 = 3
+COIN3 = 4
+PLAYER = 8
+
+# codes of observe(), relative to the observing player
+OUTSIDE = -1
+TEAMMATE = 5
+ENEMY = 6
+SELF = 7
+
+# index i of a move array is list(Moveset)[i], NO_MOVE leaves the player where it is
+MOVES = list(Moveset)
+NO_MOVE = -1
+DELTAS = np.array([move.value for move in MOVES], dtype=np.int32)
+# points for stepping onto each code, zero for everything that is not a coin
+COIN_VALUES = np.zeros(PLAYER, dtype=np.int64)
+COIN_VALUES[[COIN1, COIN2, COIN3]] = [1, 2, 3]
+
+CELL_CODES = {Wall: WALL, Coin1: COIN1, Coin2: COIN2, Coin3: COIN3}
+DATA_KEYS = {WALL: 'walls', COIN1: 'coin1', COIN2: 'coin2', COIN3: 'coin3'}
+
+
+class BatchGame:
+    def __init__(self, games: list[Game]):
+        """
+        B independent games held as arrays, stepped together with the rules of Game.movePlayer
+        Every game must have the same teams and players, the layouts may differ
+        """
+        assert games
+        first = games[0]
+        self.__playerNames = list(first.all_players)
+        self.__teamNames = list(first.teams)
+        self.__height = first.height
+        self.__width = first.width
+        numPlayers = len(self.__playerNames)
+        assert PLAYER + numPlayers <= np.iinfo(np.int16).max
+
+        # team index of every player
+        self.teamOf = np.array([self.__teamNames.index(first.all_players[name].team.name) for name in self.__playerNames], dtype=np.int32)
+        self.grid = np.zeros((len(games), self.__height, self.__width), dtype=np.int16)
+        self.positions = np.zeros((len(games), numPlayers, 2), dtype=np.int32)
+        self.scores = np.zeros((len(games), len(self.__teamNames)), dtype=np.int64)
+        self.coins = np.zeros(len(games), dtype=np.int32)
+        for i, game in enumerate(games):
+            self.load(i, game)
+
+    @classmethod
+    def new(cls, playerNames: dict[str, list[str]], batchSize: int, width: int = 10, height: int = 10) -> 'BatchGame':
+        # layouts come from the scalar engine so they follow Map's placement rules exactly
+        return cls([Game(playerNames, width, height) for _ in range(batchSize)])
+
+    @property
+    def batchSize(self):
+        return self.grid.shape[0]
+
+    @property
+    def playerNames(self):
+        return self.__playerNames
+
+    @property
+    def teamNames(self):
+        return self.__teamNames
+
+    def load(self, index: int, game: Game):
+        """
+        Replaces the game at index with a copy of a scalar game
+        """
+        assert list(game.all_players) == self.__playerNames and (game.height, game.width) == (self.__height, self.__width)
+        players = {name: p for p, name in enumerate(self.__playerNames)}
+        grid = self.grid[index]
+        for x in range(self.__height):
+            for y in range(self.__width):
+                cell = game.map.get((x, y))
+                if isinstance(cell, Player):
+                    grid[x, y] = PLAYER + players[cell.name]
+                else:
+                    grid[x, y] = CELL_CODES.get(type(cell), EMPTY)
+        for name, p in players.items():
+            self.positions[index, p] = game.all_players[name].loc
+        self.scores[index] = [game.teams[name].score for name in self.__teamNames]
+        self.coins[index] = game.map.numCoins
+
+    def step(self, moves: np.ndarray) -> np.ndarray:
+        """
+        Applies one move per player in every game, in player order as if movePlayer were called for each in turn
+        :param moves: (B, players) indices into MOVES, or NO_MOVE
+        :return: (B, teams) points scored by each team in this step
+        """
+        moves = np.asarray(moves)
+        assert moves.shape == (self.batchSize, len(self.__playerNames))
+        before = self.scores.copy()
+        games = np.arange(self.batchSize)
+        # players resolve one after another because a later move may enter a cell an earlier one left,
+        # each of those steps is vectorized over the games
+        for p in range(len(self.__playerNames)):
+            move = moves[:, p]
+            old = self.positions[:, p]
+            new = old + DELTAS[np.maximum(move, 0)]
+            inside = (move != NO_MOVE) & (new[:, 0] >= 0) & (new[:, 0] < self.__height) & (new[:, 1] >= 0) & (new[:, 1] < self.__width)
+            target = self.grid[games, np.clip(new[:, 0], 0, self.__height - 1), np.clip(new[:, 1], 0, self.__width - 1)]
+            moved = inside & (target != WALL) & (target < PLAYER)
+
+            b = games[moved]
+            value = COIN_VALUES[target[moved]]
+            self.scores[b, self.teamOf[p]] += value
+            self.coins[b] -= (value > 0).astype(np.int32)
+            self.grid[b, old[moved, 0], old[moved, 1]] = EMPTY
+            self.grid[b, new[moved, 0], new[moved, 1]] = PLAYER + p
+            self.positions[b, p] = new[moved]
+        return self.scores - before
+
+    def gameOver(self) -> np.ndarray:
+        return self.coins <= 0
+
+    def observe(self, visionRadius: int = 2) -> np.ndarray:
+        """
+        :return: (B, players, 2r+1, 2r+1) codes of the square each player sees, centred on it,
+                 players as SELF, TEAMMATE or ENEMY and cells past the edge as OUTSIDE
+        """
+        r = visionRadius
+        padded = np.pad(self.grid, ((0, 0), (r, r), (r, r)), constant_values=OUTSIDE)
+        offsets = np.arange(2 * r + 1)
+        rows = self.positions[:, :, 0, None] + offsets
+        cols = self.positions[:, :, 1, None] + offsets
+        window = padded[np.arange(self.batchSize)[:, None, None, None], rows[:, :, :, None], cols[:, :, None, :]]
+
+        isPlayer = window >= PLAYER
+        occupant = np.where(isPlayer, window - PLAYER, 0)
+        observer = np.arange(len(self.__playerNames))[None, :, None, None]
+        sameTeam = self.teamOf[occupant] == self.teamOf[observer]
+        relative = np.where(occupant == observer, SELF, np.where(sameTeam, TEAMMATE, ENEMY))
+        return np.where(isPlayer, relative, window).astype(np.int8)
+
+    def gameData(self, index: int, playerName: str, visionRadius: int = 2) -> dict:
+        """
+        The same dict Game.getGameData returns for this player, read from the arrays
+        """
+        p = self.__playerNames.index(playerName)
+        centerX, centerY = (int(v) for v in self.positions[index, p])
+        gameData = {'teammateNames': [],
+                    'teammatePositions': [],
+                    'enemyPositions': [],
+                    'currentPosition': (centerX, centerY),
+                    'coin1': [],
+                    'coin2': [],
+                    'coin3': [],
+                    'walls': []}
+        for x in range(max(centerX - visionRadius, 0), min(centerX + visionRadius, self.__height - 1) + 1):
+            for y in range(max(centerY - visionRadius, 0), min(centerY + visionRadius, self.__width - 1) + 1):
+                code = int(self.grid[index, x, y])
+                if code >= PLAYER:
+                    other = code - PLAYER
+                    if self.teamOf[other] == self.teamOf[p] and other != p:
+                        gameData['teammateNames'].append(self.__playerNames[other])
+                        gameData['teammatePositions'].append((x, y))
+                    elif self.teamOf[other] != self.teamOf[p]:
+                        gameData['enemyPositions'].append((x, y))
+                elif code in DATA_KEYS:
+                    gameData[DATA_KEYS[code]].append((x, y))
+        return gameData
+
+    def getScores(self, index: int) -> dict:
+        return {name: int(score) for name, score in zip(self.__teamNames, self.scores[index])}
+
+
+def checkEquivalence(playerNames: dict[str, list[str]], batchSize: int = 64, ticks: int = 200, visionRadius: int = 2, seed: int = 0):
+    """
+    Steps scalar games and their batched copy with the same random moves and asserts they never disagree
+    """
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    games = [Game(playerNames) for _ in range(batchSize)]
+    batch = BatchGame(games)
+    names = batch.playerNames
+    for _ in range(ticks):
+        moves = rng.integers(NO_MOVE, len(MOVES), size=(batchSize, len(names)))
+        rewards = batch.step(moves)
+        for i, game in enumerate(games):
+            before = game.getScores()
+            for p, name in enumerate(names):
+                if moves[i, p] != NO_MOVE:
+                    game.movePlayer(name, MOVES[moves[i, p]])
+            after = game.getScores()
+            assert after == batch.getScores(i)
+            assert [after[t] - before[t] for t in batch.teamNames] == rewards[i].tolist()
+            assert game.map.numCoins == batch.coins[i] and game.gameOver() == batch.gameOver()[i]
+            for name in names:
+                assert game.getGameData(name, visionRadius) == batch.gameData(i, name, visionRadius)
+    # the windows hold the same cells as the scalar view
+    observations = batch.observe(visionRadius)
+    for i, game in enumerate(games):
+        for p, name in enumerate(names):
+            data = game.getGameData(name, visionRadius)
+            x0, y0 = data['currentPosition'][0] - visionRadius, data['currentPosition'][1] - visionRadius
+            for code, key in DATA_KEYS.items():
+                assert sorted(data[key]) == sorted((x0 + a, y0 + b) for a, b in zip(*np.nonzero(observations[i, p] == code)))
+            assert len(data['enemyPositions']) == np.count_nonzero(observations[i, p] == ENEMY)
+            assert len(data['teammatePositions']) == np.count_nonzero(observations[i, p] == TEAMMATE)
+
+
+if __name__ == '__main__':
+    checkEquivalence({'TeamA': ['Charles', 'Girish'], 'TeamB': ['James', 'Jane']})
+    print('BatchGame matches Game')
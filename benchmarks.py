@@ -0,0 +1,300 @@
+"""
+Engine benchmarks with stored baselines
+
+    python benchmarks.py                         compare memory against the committed baseline, exits with 1 on a regression
+    python benchmarks.py --save                  record the memory baseline, and the times to the local time baseline
+    python benchmarks.py --check-time            also compare times against the local time baseline
+    python benchmarks.py --sizes 10,2000 --players 4 --coins 0.05,0.2 --vision 2,8
+
+Memory is the same on every machine, so its baseline is committed. Times are only comparable to a baseline saved
+on the same machine, so they are kept in a file git ignores and checked only when asked for
+"""
+
+import os
+import sys
+import json
+import time
+import statistics
+import random
+import argparse
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+
+from map import Map
+from game import Game
+from lobby import Lobby
+from moveset import Moveset
+from leaderboard import Leaderboard
+from replication import ReplicationPublisher
+from sequencing import move_payload
+import GameClient
+
+BASELINE_FILE = 'benchmark_baseline.json'
+TIME_BASELINE_FILE = 'benchmark_times.json'
+# rounds each case is timed for, the median of them is compared
+TIME_ROUNDS = 7
+# calls traced per case where the default of 20 does not fit: the handler's leaderboard state grows and compacts in
+# cycles that only average out over many ticks
+ALLOC_CALLS = {'GameClient.player_move': 200}
+# board cells built while tracing Map.__init__, large maps are slow to build so they get fewer calls, but never so
+# few that the allocator's one-off growth shows up as retained bytes
+MAP_ALLOC_CELLS = 1 << 20
+
+
+@contextmanager
+def coin_density(ratio):
+    # Map reads its coin ratios from class attributes, pin both to the requested density
+    saved = Map.COIN_MIN_RATIO, Map.COIN_MAX_RATIO
+    Map.COIN_MIN_RATIO = Map.COIN_MAX_RATIO = ratio
+    try:
+        yield
+    finally:
+        Map.COIN_MIN_RATIO, Map.COIN_MAX_RATIO = saved
+
+
+def make_game(size, players, coins):
+    names = {f'team{t}': [f'p{t}_{i}' for i in range(players // 2 + (t < players % 2))] for t in range(2)}
+    with coin_density(coins):
+        return Game(names, size, size)
+
+
+class FakeClient:
+    def __init__(self):
+        """
+        Stands in for the paho client, with the attributes GameClient's handlers expect and publish doing nothing
+        """
+        self.lobbies = {}
+        self.leaderboard = Leaderboard()
+        self.replicator = ReplicationPublisher(self)
+        self.tick_timing = False
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        pass
+
+
+def time_per_op(op, min_time):
+    """
+    :return: (median seconds per call over several rounds, each round long enough to be above timer noise,
+              median deviation of the rounds from it as a fraction of it)
+    """
+    op()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 5:
+            break
+        calls *= 2
+    rounds = []
+    for _ in range(TIME_ROUNDS):
+        start = time.perf_counter()
+        for _ in range(calls):
+            op()
+        rounds.append((time.perf_counter() - start) / calls)
+    median = statistics.median(rounds)
+    return median, statistics.median(abs(seconds - median) for seconds in rounds) / median
+
+
+def alloc_per_op(op, calls=20):
+    """
+    :return: (average peak bytes allocated during one call, average bytes one call leaves allocated)
+    """
+    # caches a first call fills are not what the calls after it cost, timing used to warm them up before this
+    op()
+    tracemalloc.start()
+    peak = 0
+    retained = 0
+    for _ in range(calls):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        op()
+        current, top = tracemalloc.get_traced_memory()
+        peak += top - before
+        retained += current - before
+    tracemalloc.stop()
+    return peak / calls, retained / calls
+
+
+def cases(size, players, coins, visions, seed):
+    """
+    Yields (name, callable) for every operation on one board
+    """
+    with coin_density(coins):
+        yield 'Map.__init__', lambda: Map(size, size, [])
+    # the layout must not depend on how many maps were built above, or runs would not measure the same board
+    random.seed(f'{seed}-{size}-{players}-{coins}')
+    rng = random.Random(f'{seed}-{size}-{players}-{coins}')
+    game = make_game(size, players, coins)
+    names = list(game.all_players)
+    locs = [(rng.randrange(size), rng.randrange(size)) for _ in range(1024)]
+    state = {'i': 0}
+
+    def map_get():
+        state['i'] += 1
+        game.map.get(locs[state['i'] % len(locs)])
+    yield 'Map.get', map_get
+
+    def map_set():
+        # write back what is there so the board is unchanged
+        state['i'] += 1
+        loc = locs[state['i'] % len(locs)]
+        game.map.set(loc, game.map.get(loc))
+    yield 'Map.set', map_set
+
+    moves = list(Moveset)
+
+    def move_player():
+        # undone straight away so every round measures the same board
+        state['i'] += 1
+        game.undoMove(game.movePlayer(names[state['i'] % len(names)], moves[rng.randrange(4)]))
+    yield 'Game.movePlayer', move_player
+
+    yield 'Game.getScores', game.getScores
+
+    for vision in visions:
+        yield f'Game.getGameData[vision={vision}]', lambda vision=vision: game.getGameData(names[0], vision)
+        yield f'json.dumps(getGameData)[vision={vision}]', lambda vision=vision: json.dumps(game.getGameData(names[0], vision))
+
+        def resolve_turn(vision=vision):
+            # what GameClient.player_move does once every move of a tick is in
+            records = [game.movePlayer(name, moves[rng.randrange(4)]) for name in names]
+            for name in names:
+                json.dumps(game.getGameData(name, vision))
+            json.dumps(game.getScores())
+            for record in reversed(records):
+                game.undoMove(record)
+        yield f'turn[vision={vision}]', resolve_turn
+
+    # the server's own move handler, a whole tick of it: every player's move, the last one resolving the turn
+    client = FakeClient()
+    lobby = client.lobbies['bench'] = Lobby('bench')
+    lobby.start(game)
+    devnull = open(os.devnull, 'w')
+
+    def player_move():
+        # from a fork of the same board every time, the handler's moves cannot be undone
+        lobby.game = game.fork()
+        with redirect_stdout(devnull):
+            for name in names:
+                GameClient.player_move(client, ['games', 'bench', name, 'move'],
+                                       move_payload(moves[rng.randrange(4)].name, lobby.tick).encode())
+        # the fork is dropped again, so retained bytes are what the handler itself kept
+        lobby.game = game
+    yield 'GameClient.player_move', player_move
+
+
+def run(args, timed):
+    """
+    :return: ({case: memory results}, {case: time results}, empty unless timed)
+    """
+    memory = {}
+    times = {}
+    for size in args.sizes:
+        for players in args.players:
+            for coins in args.coins:
+                for name, op in cases(size, players, coins, args.vision, args.seed):
+                    key = f'{name}[size={size},players={players},coins={coins}]'
+                    line = f'{key:80}'
+                    if timed:
+                        seconds, noise = time_per_op(op, args.min_time)
+                        times[key] = {'seconds': seconds, 'noise': noise}
+                        line += f' {seconds * 1e6:12.2f} us +-{noise:4.0%}'
+                    calls = max(2, min(20, MAP_ALLOC_CELLS // (size * size))) if name == 'Map.__init__' else ALLOC_CALLS.get(name, 20)
+                    peak, retained = alloc_per_op(op, calls=calls)
+                    memory[key] = {'peak_bytes': peak, 'retained_bytes': retained}
+                    print(f'{line} {peak:12.0f} B peak {retained:12.0f} B retained', flush=True)
+    return memory, times
+
+
+def compare(results, baseline, threshold):
+    """
+    :return: list of descriptions of every case hungrier than the baseline by more than threshold
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in ('peak_bytes', 'retained_bytes'):
+            # small absolute differences are noise, not regressions
+            if result[metric] > base[metric] * (1 + threshold) and result[metric] - base[metric] > 256:
+                regressions.append(f'{key} {metric}: {base[metric]:.4g} -> {result[metric]:.4g}')
+    return regressions
+
+
+def compare_times(results, baseline, threshold):
+    """
+    :return: list of descriptions of every case slower than the baseline by more than threshold and the noise of
+             either run, so a busy moment during one case does not fail the check
+    """
+    # the noise is measured within one process, a whole process can land tens of percent slower on small cases
+    # than the one before it, which the threshold has to cover
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        allowed = threshold + 3 * max(result['noise'], base['noise'])
+        if result['seconds'] > base['seconds'] * (1 + allowed) and result['seconds'] - base['seconds'] > 1e-6:
+            regressions.append(f"{key} seconds: {base['seconds']:.4g} -> {result['seconds']:.4g} (allowed +{allowed:.0%})")
+    return regressions
+
+
+def load(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def int_list(text):
+    return [int(x) for x in text.split(',')]
+
+
+def float_list(text):
+    return [float(x) for x in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the game engine and check for regressions")
+    parser.add_argument('--sizes', type=int_list, default=[10, 100, 500, 2000], help="board sizes, comma separated")
+    parser.add_argument('--players', type=int_list, default=[2, 8], help="player counts, comma separated")
+    parser.add_argument('--coins', type=float_list, default=[0.1], help="coin densities, comma separated")
+    parser.add_argument('--vision', type=int_list, default=[2, 5], help="vision radii, comma separated")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds each case is timed for")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="memory baseline, committed")
+    parser.add_argument('--time-baseline', default=TIME_BASELINE_FILE, help="time baseline, saved on this machine and not committed")
+    parser.add_argument('--check-time', action='store_true', help="also compare times against the time baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed memory growth, as a fraction of the baseline")
+    parser.add_argument('--time-threshold', type=float, default=1.0, help="allowed slowdown, as a fraction of the baseline, on top of the measured noise")
+    parser.add_argument('--save', action='store_true', help="store the results as the new baselines")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    memory, times = run(args, timed=args.save or args.check_time)
+
+    if args.save:
+        for path, results in ((args.baseline, memory), (args.time_baseline, times)):
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=1, sort_keys=True)
+            print(f'Saved baseline to {path}')
+        sys.exit(0)
+
+    regressions = []
+    checks = [(args.baseline, memory, compare, args.threshold)]
+    if args.check_time:
+        checks.append((args.time_baseline, times, compare_times, args.time_threshold))
+    for path, results, check, threshold in checks:
+        baseline = load(path)
+        if baseline is None:
+            print(f'No baseline at {path}, run with --save to record one')
+            continue
+        regressions += check(results, baseline, threshold)
+        print('Compared against ' + path)
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    if regressions:
+        sys.exit(1)
+    print('No regressions')
@@ -0,0 +1,113 @@
+class ChunkedGrid:
+    TILE_SIZE = 16
+
+    def __init__(self, height: int, width: int, default=None):
+        """
+        Grid that only allocates fixed-size tiles once a cell in them is written
+        :param height: number of rows
+        :param width: number of columns
+        :param default: value of every cell that was never written
+        """
+        assert isinstance(height, int) and isinstance(width, int)
+        self.__height = height
+        self.__width = width
+        self.__default = default
+        self.__tiles: dict[tuple[int, int], list[list[object]]] = {}
+        # cells of each tile that are not the default, a tile is dropped once it is back to all defaults
+        self.__counts: dict[tuple[int, int], int] = {}
+        # tiles this grid may write in place, the others are still shared with a fork and get copied on first write
+        self.__ownedTiles: set[tuple[int, int]] = set()
+
+    @property
+    def height(self):
+        return self.__height
+
+    @property
+    def width(self):
+        return self.__width
+
+    @property
+    def numTiles(self):
+        return len(self.__tiles)
+
+    def fork(self) -> 'ChunkedGrid':
+        """
+        Returns a copy that shares tiles with this grid until either of them writes to a tile
+        """
+        other = ChunkedGrid.__new__(ChunkedGrid)
+        other.__height = self.__height
+        other.__width = self.__width
+        other.__default = self.__default
+        other.__tiles = dict(self.__tiles)
+        other.__counts = dict(self.__counts)
+        self.__ownedTiles = set()
+        other.__ownedTiles = set()
+        return other
+
+    def get(self, loc: tuple[int, int]):
+        tile = self.__tiles.get((loc[0] // ChunkedGrid.TILE_SIZE, loc[1] // ChunkedGrid.TILE_SIZE))
+        if tile is None:
+            return self.__default
+        return tile[loc[0] % ChunkedGrid.TILE_SIZE][loc[1] % ChunkedGrid.TILE_SIZE]
+
+    def set(self, loc: tuple[int, int], item: object):
+        size = ChunkedGrid.TILE_SIZE
+        key = (loc[0] // size, loc[1] // size)
+        x, y = loc[0] % size, loc[1] % size
+        tile = self.__tiles.get(key)
+        if tile is None:
+            if item == self.__default:
+                return
+            tile = [[self.__default for _ in range(size)] for _ in range(size)]
+            self.__tiles[key] = tile
+            self.__counts[key] = 0
+            self.__ownedTiles.add(key)
+        wasDefault = tile[x][y] == self.__default
+        isDefault = item == self.__default
+        if wasDefault and isDefault:
+            return
+        if isDefault and self.__counts[key] == 1:
+            # the last thing in the tile is gone, so memory keeps following what is on the board as things move
+            del self.__tiles[key]
+            del self.__counts[key]
+            self.__ownedTiles.discard(key)
+            return
+        if key not in self.__ownedTiles:
+            tile = [row[:] for row in tile]
+            self.__tiles[key] = tile
+            self.__ownedTiles.add(key)
+        tile[x][y] = item
+        self.__counts[key] += wasDefault - isDefault
+
+    def window(self, minX: int, minY: int, maxX: int, maxY: int):
+        """
+        Yields (loc, item) for every cell in the inclusive rectangle that is not the default, in row-major order
+        Only the tiles overlapping the rectangle are looked at, and tiles never written are skipped whole
+        """
+        size = ChunkedGrid.TILE_SIZE
+        minX, minY = max(minX, 0), max(minY, 0)
+        maxX, maxY = min(maxX, self.__height - 1), min(maxY, self.__width - 1)
+        tileRows = range(minX // size, maxX // size + 1)
+        tileCols = range(minY // size, maxY // size + 1)
+        # {tile row: [tile column, ...]} of the written tiles in the rectangle
+        bands: dict[int, list[int]] = {}
+        if len(self.__tiles) < len(tileRows) * len(tileCols):
+            # a rectangle over most of a mostly empty grid, such as the whole board, has more tiles to look up than
+            # the grid has written
+            for tileX, tileY in self.__tiles:
+                if tileX in tileRows and tileY in tileCols:
+                    bands.setdefault(tileX, []).append(tileY)
+        else:
+            for tileX in tileRows:
+                written = [tileY for tileY in tileCols if (tileX, tileY) in self.__tiles]
+                if written:
+                    bands[tileX] = written
+        for tileX in sorted(bands):
+            written = sorted(bands[tileX])
+            for x in range(max(minX, tileX * size), min(maxX, tileX * size + size - 1) + 1):
+                for tileY in written:
+                    row = self.__tiles[(tileX, tileY)][x % size]
+                    for y in range(max(minY, tileY * size), min(maxY, tileY * size + size - 1) + 1):
+                        item = row[y % size]
+                        if item != self.__default:
+                            yield (x, y), item
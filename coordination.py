@@ -0,0 +1,89 @@
+import json
+
+from distanceTable import UNREACHABLE
+
+
+def intents_topic(lobby_name: str, team_name: str):
+    return f"games/{lobby_name}/teams/{team_name}/intents"
+
+
+class TeamCoordinator:
+    # intents older than this many server ticks are dropped, the teammate probably left or fell behind
+    MAX_AGE = 2
+
+    def __init__(self, player_name: str):
+        """
+            Splits known coins between teammates so they stop chasing the same one
+            :param player_name: name of the bot this coordinator decides for
+        """
+        self.player_name = player_name
+        # server tick of the game state the latest decision was made on, every teammate sees the same ticks
+        self.tick = 0
+        # {teammate: (position, target, target value, tick)} from the latest intent of each teammate
+        self.intents = {}
+
+    def receive(self, payload):
+        """
+            Records a teammate's intent published on the team topic
+            :param payload: raw message payload
+        """
+        intent = json.loads(payload)
+        if intent["player_name"] == self.player_name:
+            return
+        target = tuple(intent["target"]) if intent["target"] is not None else None
+        self.intents[intent["player_name"]] = (tuple(intent["position"]), target, intent["value"], intent["tick"])
+
+    def intent_payload(self, position, target, coins):
+        return json.dumps({'player_name' : self.player_name,
+                           'position' : position,
+                           'target' : target,
+                           'value' : coins.get(target) if target is not None else None,
+                           'tick' : self.tick})
+
+    def assign(self, position, coins, table, tick=None):
+        """
+            Greedily matches teammates to coins by value per step and returns the coins left for this bot
+            :param position: current position of this bot
+            :param coins: {cell: coin value} known to this bot
+            :param table: DistanceTable for the walls this bot knows
+            :param tick: tick of the game state being decided on, None from servers that do not number their states,
+                         then ticks are counted locally and only line up with teammates that started at the same time
+        """
+        self.tick = self.tick + 1 if tick is None else tick
+        for name in [name for name, intent in self.intents.items() if self.tick - intent[3] > TeamCoordinator.MAX_AGE]:
+            del self.intents[name]
+        players = {self.player_name: tuple(position)}
+        values = dict(coins)
+        for name, (teammate_pos, target, value, _) in self.intents.items():
+            players[name] = teammate_pos
+            if target is not None and value is not None:
+                values.setdefault(target, value)
+        if len(players) == 1:
+            return coins
+
+        pairs = []
+        for name, pos in players.items():
+            # rows are cached per layout, so each teammate costs one lookup after their first tick
+            from_pos = table.row(pos)
+            if from_pos is None:
+                continue
+            for coin, value in values.items():
+                index = table.index(coin)
+                dist = UNREACHABLE if index is None else from_pos[index]
+                if dist > 0:
+                    pairs.append((-value / dist, name, coin))
+        pairs.sort()
+
+        # each teammate runs this greedy on the coins and walls it knows, plus the targets teammates announced, so
+        # the split is the same for teammates that know the same coins, and can differ while their knowledge does
+        taken_players = set()
+        taken_coins = {}
+        for _, name, coin in pairs:
+            if name in taken_players or coin in taken_coins:
+                continue
+            taken_players.add(name)
+            taken_coins[coin] = name
+            if len(taken_players) == len(players):
+                break
+        return {coin: value for coin, value in coins.items()
+                if taken_coins.get(coin, self.player_name) == self.player_name}
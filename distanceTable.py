@@ -0,0 +1,189 @@
+from array import array
+from collections import OrderedDict, deque
+from typing import Optional
+import hashlib
+import threading
+import time
+
+UNREACHABLE = -1
+STEPS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+class DistanceTable:
+    # boards up to this many cells keep every row once built, larger ones keep the most recently used rows
+    ALL_PAIRS_MAX_CELLS = 1024
+    # cells worth of rows kept for tables that are too large to build in full, at least MIN_LAZY_ROWS rows
+    MAX_LAZY_CELLS = 1 << 22
+    MIN_LAZY_ROWS = 8
+
+    def __init__(self, height: int, width: int, walls: frozenset, origin: tuple[int, int] = (0, 0), allPairs: bool = True):
+        """
+        Shortest path lengths between cells of a board, walking around walls only
+        :param height: number of rows covered by the table
+        :param width: number of columns covered by the table
+        :param walls: every wall cell of the layout, walls outside the covered rectangle are ignored
+        :param origin: board cell of the table's top left corner, for tables covering part of a board
+        :param allPairs: keep every row when the table is small enough, fill() builds the ones not asked for yet
+        Rows are only ever built by row() under the caller's deadline, or by fill(), never here
+        """
+        assert isinstance(height, int) and isinstance(width, int)
+        self.__height = height
+        self.__width = width
+        self.__origin = origin
+        self.__open = array('b', [1]) * (height*width)
+        for wall in walls:
+            index = self.index(wall)
+            if index is not None:
+                self.__open[index] = 0
+        self.__rows: OrderedDict[int, array] = OrderedDict()
+
+        self.allPairs = allPairs and height*width <= DistanceTable.ALL_PAIRS_MAX_CELLS
+        if self.allPairs:
+            self.__maxRows = height*width
+        else:
+            self.__maxRows = min(height*width, max(DistanceTable.MIN_LAZY_ROWS, DistanceTable.MAX_LAZY_CELLS // (height*width)))
+
+    @property
+    def height(self):
+        return self.__height
+
+    @property
+    def width(self):
+        return self.__width
+
+    @property
+    def origin(self):
+        return self.__origin
+
+    @property
+    def maxCells(self) -> int:
+        """
+        Most row cells the table holds at once, what the shared cache budgets it by
+        """
+        return self.__maxRows * self.__height * self.__width
+
+    def fill(self, deadline: Optional[float] = None) -> bool:
+        """
+        Builds the rows of an all-pairs table that were not asked for yet, for callers with time to spare
+        :param deadline: time.perf_counter() value after which the rest is left for later calls
+        :return: True once every row is built
+        """
+        if not self.allPairs:
+            return False
+        for source in range(self.__height*self.__width):
+            if self.__open[source] and source not in self.__rows:
+                distances = self.__bfs(source, deadline)
+                if distances is None:
+                    return False
+                self.__rows[source] = distances
+        return True
+
+    def index(self, loc: tuple[int, int]) -> Optional[int]:
+        """
+        :return: position of loc in a row, or None if loc is outside the table
+        """
+        x, y = loc[0] - self.__origin[0], loc[1] - self.__origin[1]
+        if 0 <= x < self.__height and 0 <= y < self.__width:
+            return x*self.__width + y
+        return None
+
+    def row(self, source: tuple[int, int], deadline: Optional[float] = None) -> Optional[array]:
+        """
+        :param source: cell the distances are measured from
+        :param deadline: time.perf_counter() value after which an unbuilt row is abandoned
+        :return: distances indexed by DistanceTable.index, or None if source is a wall, outside the table or the deadline passed
+        """
+        index = self.index(source)
+        if index is None:
+            return None
+        distances = self.__rows.get(index)
+        if distances is not None:
+            if not self.allPairs:
+                self.__rows.move_to_end(index)
+            return distances
+        if not self.__open[index]:
+            return None
+
+        distances = self.__bfs(index, deadline)
+        if distances is None:
+            return None
+        self.__rows[index] = distances
+        if len(self.__rows) > self.__maxRows:
+            self.__rows.popitem(last=False)
+        return distances
+
+    def distance(self, a: tuple[int, int], b: tuple[int, int]) -> Optional[int]:
+        """
+        :return: number of moves from a to b, or None if b cannot be reached from a
+        """
+        distances = self.row(a)
+        index = self.index(b)
+        if distances is None or index is None:
+            return None
+        d = distances[index]
+        return None if d == UNREACHABLE else d
+
+    def __bfs(self, source: int, deadline: Optional[float]) -> Optional[array]:
+        height, width, isOpen = self.__height, self.__width, self.__open
+        distances = array('i', [UNREACHABLE]) * (height*width)
+        distances[source] = 0
+        frontier = deque([source])
+        # counts loop passes, not cells reached, one pass can reach up to 4 cells and step over every multiple
+        iterations = 0
+        while frontier:
+            iterations += 1
+            if deadline is not None and iterations % 1024 == 0 and time.perf_counter() > deadline:
+                return None
+            current = frontier.popleft()
+            x, y = divmod(current, width)
+            d = distances[current] + 1
+            for dx, dy in STEPS:
+                nx, ny = x+dx, y+dy
+                if 0 <= nx < height and 0 <= ny < width:
+                    neighbor = nx*width + ny
+                    if isOpen[neighbor] and distances[neighbor] == UNREACHABLE:
+                        distances[neighbor] = d
+                        frontier.append(neighbor)
+        return distances
+
+
+# row cells the shared tables may hold between them, 64 MB of distances, the most recent table is kept even if larger
+MAX_CACHED_CELLS = 1 << 24
+# tables shared by every caller in the process, most recently used last
+_tables: OrderedDict[tuple, DistanceTable] = OrderedDict()
+_cachedCells = 0
+# bots deciding on their own threads look tables up at the same time
+_tablesLock = threading.Lock()
+
+
+def layoutKey(height: int, width: int, walls, origin: tuple[int, int] = (0, 0), allPairs: bool = True) -> tuple:
+    return height, width, frozenset(walls), origin, allPairs
+
+
+def layoutHash(height: int, width: int, walls) -> str:
+    """
+    Names a layout's walls the same way in every process, unlike hash() of layoutKey
+    """
+    cells = ";".join(f"{x},{y}" for x, y in sorted(walls))
+    return hashlib.sha1(f"{height}x{width}:{cells}".encode()).hexdigest()[:16]
+
+
+def getDistanceTable(height: int, width: int, walls, origin: tuple[int, int] = (0, 0), allPairs: bool = True) -> DistanceTable:
+    """
+    Returns the table for a layout, building it the first time the layout is seen
+    :param walls: iterable of wall cells
+    """
+    global _cachedCells
+    key = layoutKey(height, width, walls, origin, allPairs)
+    with _tablesLock:
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+            return table
+        table = DistanceTable(height, width, key[2], origin, allPairs)
+        _tables[key] = table
+        _cachedCells += table.maxCells
+        while _cachedCells > MAX_CACHED_CELLS and len(_tables) > 1:
+            _, evicted = _tables.popitem(last=False)
+            _cachedCells -= evicted.maxCells
+        return table
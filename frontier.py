@@ -0,0 +1,60 @@
+from distanceTable import UNREACHABLE
+from planner import directions
+
+
+class Frontier:
+    def __init__(self, height: int, width: int):
+        """
+            Tracks known cells that border unexplored ones, updated only around newly seen cells
+            :param height: number of rows on the board
+            :param width: number of columns on the board
+        """
+        self.height = height
+        self.width = width
+        self.known = set()
+        self.cells = set()
+
+    def neighbors(self, cell):
+        for dx, dy in directions:
+            x, y = cell[0]+dx, cell[1]+dy
+            if 0 <= x < self.height and 0 <= y < self.width:
+                yield (x, y)
+
+    def unknown_neighbors(self, cell):
+        return sum(1 for n in self.neighbors(cell) if n not in self.known)
+
+    def update(self, seen, walls):
+        """
+            Marks cells as explored and fixes up the frontier around the ones that were new
+            :param seen: cells visible this tick
+            :param walls: set of known wall cells
+        """
+        new = [cell for cell in seen if cell not in self.known]
+        self.known.update(new)
+        for cell in new:
+            # a new cell can only change its own status and that of its neighbors
+            for c in (cell, *self.neighbors(cell)):
+                if c in self.known and c not in walls and self.unknown_neighbors(c) > 0:
+                    self.cells.add(c)
+                else:
+                    self.cells.discard(c)
+
+    def target(self, start, table):
+        """
+            Returns the closest reachable frontier cell, preferring the ones that open up more unknown cells
+            :param start: current position of the player
+            :param table: DistanceTable for the known walls
+        """
+        from_start = table.row(start)
+        if from_start is None:
+            return None
+        best = None
+        for cell in self.cells:
+            index = table.index(cell)
+            dist = UNREACHABLE if index is None else from_start[index]
+            if dist <= 0:
+                continue
+            key = (dist, -self.unknown_neighbors(cell), cell)
+            if best is None or key < best:
+                best = key
+        return None if best is None else best[2]
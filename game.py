@@ -7,12 +7,16 @@ from moveset import Moveset
 from player import Player
 from team import Team
 from gameItems import *
+from vision import Vision, SQUARE
+from typing import Optional
 import random
 
 class Game:
-    def __init__(self, playerNames: dict[str,list[str]], width: int = 10, height: int = 10):
+    def __init__(self, playerNames: dict[str,list[str]], width: int = 10, height: int = 10, layout: Optional[Map] = None, sparse: bool = False):
         """
         :param playerNames: Dictionary for each team name with a list of player names
+        :param layout: Map generated without players, from a LayoutPool, used instead of generating one
+        :param sparse: generate a Map that only allocates the parts of the board with something on them
         """
         self.numTeams = len(playerNames)
 
@@ -20,7 +24,15 @@ class Game:
 
         self.__height = height
         self.__width = width
-        self.map = Map(height, width, list(self.all_players.values()))
+        # what every player sees, unless setVision gave them their own
+        self.vision = Vision()
+        self.__playerVision: dict[str, Vision] = {}
+        if layout is None:
+            self.map = Map(height, width, list(self.all_players.values()), sparse=sparse)
+        else:
+            assert layout.height == height and layout.width == width
+            layout.addPlayers(list(self.all_players.values()))
+            self.map = layout
 
     def __initializePlayers(self, playerNames: dict[str,list[str]]):
         teams = {}
@@ -32,7 +44,73 @@ class Game:
 
         return teams, all_players
 
-    def movePlayer(self, playerName: str, move: Moveset):
+    @property
+    def height(self):
+        return self.__height
+
+    @property
+    def width(self):
+        return self.__width
+
+    def fork(self) -> 'Game':
+        """
+        Returns an independent copy for lookahead, sharing map rows with this game until either side moves into them
+        """
+        other = Game.__new__(Game)
+        other.numTeams = self.numTeams
+        other.teams = {}
+        for teamName, team in self.teams.items():
+            other.teams[teamName] = Team(teamName)
+            other.teams[teamName].increaseScore(team.score)
+        other.__height = self.__height
+        other.__width = self.__width
+        other.vision = self.vision
+        other.__playerVision = dict(self.__playerVision)
+        other.map = self.map.fork()
+        other.all_players = {}
+        for playerName, player in self.all_players.items():
+            forked = Player(playerName, other.teams[player.team.name])
+            other.all_players[playerName] = forked
+            if player.loc is not None:
+                forked.loc = player.loc
+                other.map.set(player.loc, forked)
+        return other
+
+    def snapshot(self) -> dict:
+        """
+        Everything needed to rebuild this game elsewhere, as JSON-serializable data
+        """
+        return {'map': self.map.snapshot(),
+                'teams': {teamName: {'score': team.score,
+                                     'players': {playerName: player.loc for playerName, player in self.all_players.items()
+                                                 if player.team is team}}
+                          for teamName, team in self.teams.items()},
+                'vision': self.vision.toDict(),
+                'playerVision': {playerName: vision.toDict() for playerName, vision in self.__playerVision.items()}}
+
+    @classmethod
+    def fromSnapshot(cls, data: dict) -> 'Game':
+        layout = Map.fromSnapshot(data['map'])
+        game = Game.__new__(Game)
+        game.numTeams = len(data['teams'])
+        game.teams, game.all_players = game.__initializePlayers({teamName: list(team['players']) for teamName, team in data['teams'].items()})
+        game.__height = layout.height
+        game.__width = layout.width
+        game.vision = Vision.fromDict(data['vision'])
+        game.__playerVision = {playerName: Vision.fromDict(vision) for playerName, vision in data['playerVision'].items()}
+        game.map = layout
+        for teamName, team in data['teams'].items():
+            game.teams[teamName].increaseScore(team['score'])
+            for playerName, loc in team['players'].items():
+                player = game.all_players[playerName]
+                player.loc = tuple(loc)
+                layout.set(player.loc, player)
+        return game
+
+    def movePlayer(self, playerName: str, move: Moveset) -> Optional[tuple]:
+        """
+        :return: record to pass to undoMove, or None if the move was blocked and nothing changed
+        """
         assert isinstance(move, Moveset)
         player = self.getPlayer(playerName)
 
@@ -51,9 +129,25 @@ class Game:
             player.team.increaseScore(cell.value)
             self.map.decreaseCoin()
 
+        old_loc = player.loc
         self.map.set(player.loc, None)
         self.map.set(new_loc, player)
         player.loc = new_loc
+        return player, old_loc, cell
+
+    def undoMove(self, record: Optional[tuple]):
+        """
+        Reverts a move returned by movePlayer, moves must be undone in the reverse order they were made
+        """
+        if record is None:
+            return
+        player, old_loc, cell = record
+        if isinstance(cell, Coin):
+            player.team.decreaseScore(cell.value)
+            self.map.increaseCoin()
+        self.map.set(player.loc, cell)
+        self.map.set(old_loc, player)
+        player.loc = old_loc
 
     def getPlayer(self, playerName: str) -> Player:
         assert isinstance(playerName, str)
@@ -62,10 +156,28 @@ class Game:
         except KeyError:
             raise KeyError(f'{playerName} is not a valid player name')
 
-    def getGameData(self, playerName:str, visionRadius: int = 2) -> dict:
+    def setVision(self, vision: Vision, playerName: Optional[str] = None):
+        """
+        Sets the vision of one player, or of the whole game when no player is given
+        """
+        assert isinstance(vision, Vision)
+        if playerName is None:
+            self.vision = vision
+        else:
+            self.getPlayer(playerName)
+            self.__playerVision[playerName] = vision
+
+    def getVision(self, playerName: str) -> Vision:
+        return self.__playerVision.get(playerName, self.vision)
+
+    @property
+    def playerVisions(self) -> dict[str, Vision]:
+        return dict(self.__playerVision)
+
+    def getGameData(self, playerName:str, visionRadius: Optional[int] = None) -> dict:
         """
         :param playerName:
-        :param vision:
+        :param visionRadius: square of this radius instead of the player's vision
         :return: {
             teammateNames: [],
             teammatePositions: [(x,y),...],
@@ -78,13 +190,9 @@ class Game:
         }
         """
         assert isinstance(playerName, str)
-        assert isinstance(visionRadius, int)
+        assert visionRadius is None or isinstance(visionRadius, int)
         player = self.getPlayer(playerName)
-        centerX, centerY = player.loc
-        minX = max(centerX - visionRadius, 0)
-        maxX = min(centerX + visionRadius, self.__height-1)
-        minY = max(centerY - visionRadius, 0)
-        maxY = min(centerY + visionRadius, self.__width-1)
+        vision = self.getVision(playerName) if visionRadius is None else Vision(SQUARE, visionRadius)
         gameData = {'teammateNames': [],
                     'teammatePositions': [],
                     'enemyPositions': [],
@@ -94,13 +202,19 @@ class Game:
                     'coin3': [],
                     'walls': []}
 
-        for x in range(minX, maxX+1):
-            for y in range(minY, maxY+1):
-                cell = self.map.get((x,y))
-                self.__addGameData(gameData, cell, (x,y), player)
+        # only occupied cells around the player are visited, empty ones add nothing to the game data,
+        # and the shape and sight lines are looked up in the vision's cached masks
+        centerX, centerY = player.loc
+        r = vision.radius
+        for loc, cell in self.map.window(centerX - r, centerY - r, centerX + r, centerY + r):
+            if vision.sees(player.loc, loc, self.__isWall):
+                self.__addGameData(gameData, cell, loc, player)
 
         return gameData
 
+    def __isWall(self, loc: tuple[int, int]) -> bool:
+        return isinstance(self.map.get(loc), Wall)
+
     def __addGameData(self, gameData: dict, cell: object, loc: tuple[int, int], player: Player):
         if isinstance(cell, Player):
             if cell.team is player.team and cell is not player:
@@ -0,0 +1,117 @@
+import random
+from typing import Optional
+
+import numpy as np
+
+from game import Game
+from batchGame import MOVES, NO_MOVE, OUTSIDE, EMPTY, WALL, COIN1, COIN2, COIN3, TEAMMATE, ENEMY, SELF
+
+DATA_CODES = {'walls': WALL, 'coin1': COIN1, 'coin2': COIN2, 'coin3': COIN3,
+              'teammatePositions': TEAMMATE, 'enemyPositions': ENEMY}
+
+
+class GameEnv:
+    def __init__(self, playerNames: dict[str, list[str]], width: int = 10, height: int = 10, visionRadius: int = 2,
+                 poolSize: int = 64, maxTicks: Optional[int] = None, seed: Optional[int] = None):
+        """
+        reset/step environment around Game for training and evaluating policies
+        :param playerNames: Dictionary for each team name with a list of player names
+        :param poolSize: layouts generated up front, every reset starts from a fork of one of them
+        :param maxTicks: steps after which an episode is cut off even if coins are left
+        :param seed: seeds the layout pool
+        """
+        self.__visionRadius = visionRadius
+        self.__maxTicks = maxTicks
+        self.__rng = random.Random(seed)
+
+        state = random.getstate()
+        random.seed(seed)
+        # Map only uses the global generator, this keeps the pool reproducible without disturbing anyone else's
+        self.__pool = [Game(playerNames, width, height) for _ in range(poolSize)]
+        random.setstate(state)
+
+        first = self.__pool[0]
+        self.__playerNames = list(first.all_players)
+        self.__teamNames = list(first.teams)
+        self.__teamOf = [self.__teamNames.index(first.all_players[name].team.name) for name in self.__playerNames]
+        self.game: Optional[Game] = None
+        self.__scores = None
+        self.__ticks = 0
+
+    @property
+    def playerNames(self):
+        return self.__playerNames
+
+    @property
+    def teamNames(self):
+        return self.__teamNames
+
+    @property
+    def observationShape(self):
+        side = 2 * self.__visionRadius + 1
+        return len(self.__playerNames), side, side
+
+    def reset(self, seed: Optional[int] = None) -> np.ndarray:
+        """
+        :param seed: picks the layout, the same seed always gives the same starting game
+        :return: observation of every player, see observe
+        """
+        rng = self.__rng if seed is None else random.Random(seed)
+        # the fork shares the layout's rows until they are written to, so a reset costs no map generation or copy
+        self.game = self.__pool[rng.randrange(len(self.__pool))].fork()
+        self.__scores = np.zeros(len(self.__teamNames), dtype=np.int64)
+        self.__ticks = 0
+        return self.observe()
+
+    def step(self, actions) -> tuple[np.ndarray, np.ndarray, bool, dict]:
+        """
+        :param actions: one index into MOVES per player in playerNames order, or NO_MOVE, applied in that order
+        :return: observations, points each player's team scored this step, whether the episode ended, info
+        """
+        assert self.game is not None, "reset must be called first"
+        for name, action in zip(self.__playerNames, actions):
+            if action != NO_MOVE:
+                self.game.movePlayer(name, MOVES[action])
+        self.__ticks += 1
+
+        scores = np.array([self.game.teams[name].score for name in self.__teamNames], dtype=np.int64)
+        teamRewards = scores - self.__scores
+        self.__scores = scores
+
+        truncated = self.__maxTicks is not None and self.__ticks >= self.__maxTicks
+        done = self.game.gameOver() or truncated
+        info = {'scores': self.game.getScores(), 'ticks': self.__ticks, 'truncated': truncated and not self.game.gameOver()}
+        return self.observe(), teamRewards[self.__teamOf], done, info
+
+    def observe(self) -> np.ndarray:
+        """
+        :return: (players, 2r+1, 2r+1) int8 codes from batchGame of what getGameData shows each player, centred on it
+        """
+        r = self.__visionRadius
+        observation = np.full(self.observationShape, EMPTY, dtype=np.int8)
+        height, width = self.game.height, self.game.width
+        for p, name in enumerate(self.__playerNames):
+            data = self.game.getGameData(name, r)
+            x0, y0 = data['currentPosition'][0] - r, data['currentPosition'][1] - r
+            window = observation[p]
+            # cells past the edge of the board
+            window[:max(-x0, 0)] = OUTSIDE
+            window[max(height - x0, 0):] = OUTSIDE
+            window[:, :max(-y0, 0)] = OUTSIDE
+            window[:, max(width - y0, 0):] = OUTSIDE
+            for key, code in DATA_CODES.items():
+                for x, y in data[key]:
+                    window[x - x0, y - y0] = code
+            window[r, r] = SELF
+        return observation
+
+
+if __name__ == '__main__':
+    env = GameEnv({'TeamA': ['Charles', 'Girish'], 'TeamB': ['James']}, maxTicks=100, seed=1)
+    obs = env.reset(seed=0)
+    done = False
+    total = np.zeros(len(env.playerNames), dtype=np.int64)
+    while not done:
+        obs, rewards, done, info = env.step([random.randrange(len(MOVES)) for _ in env.playerNames])
+        total += rewards
+    print(info, dict(zip(env.playerNames, total.tolist())))
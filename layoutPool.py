@@ -0,0 +1,118 @@
+import queue
+import threading
+from collections import OrderedDict
+
+from map import Map, getDefaultWallChoices
+from chunkedGrid import ChunkedGrid
+
+
+class LayoutPool:
+    # board cells the queued layouts of every size may add up to, sizes not requested for longest are dropped first
+    MAX_POOLED_CELLS = 1 << 22
+    # boards with at least this many cells are generated sparse, a dense one would hold a slot for every cell of a
+    # board that is mostly empty
+    SPARSE_MIN_CELLS = 1 << 18
+
+    def __init__(self, sizes: list[tuple[int, int]], depth: int = 4):
+        """
+        Generates maps without players on a background thread, so starting a game only has to place the players
+        and the layout's distance table is ready before the game starts
+        :param sizes: (height, width) of the boards to keep layouts ready for from the start, other sizes are
+                      added the first time a game asks for them
+        :param depth: layouts kept ready for each size, fewer for sizes too large to keep that many of
+        """
+        self.__depth = depth
+        # queue of ready layouts for every size, most recently requested last
+        self.__queues: OrderedDict[tuple[int, int], queue.Queue] = OrderedDict()
+        self.__pooledCells = 0
+        # take runs on the paho thread while the background thread walks the queues
+        self.__lock = threading.Lock()
+        self.__wake = threading.Event()
+        # layouts that had to be generated on the caller's thread because none was ready
+        self.misses = 0
+        for height, width in sizes:
+            self.__track(height, width)
+        self.__thread = threading.Thread(target=self.__run, name="LayoutPool", daemon=True)
+        self.__thread.start()
+
+    def take(self, height: int, width: int) -> Map:
+        """
+        :return: a layout of that size that no one else holds, generated on the spot if the pool has none ready
+        """
+        layout = None
+        with self.__lock:
+            pending = self.__track(height, width)
+        try:
+            layout = pending.get_nowait()
+        except queue.Empty:
+            pass
+        self.__wake.set()
+        if layout is None:
+            self.misses += 1
+            layout = Map(height, width, [], sparse=LayoutPool.isSparse(height, width))
+        return layout
+
+    @staticmethod
+    def isSparse(height: int, width: int) -> bool:
+        return height*width >= LayoutPool.SPARSE_MIN_CELLS
+
+    @staticmethod
+    def cells(height: int, width: int) -> int:
+        """
+        Cells a layout of that size holds a slot for, a sparse one only has the tiles something was placed in
+        """
+        if not LayoutPool.isSparse(height, width):
+            return height*width
+        placed = int(Map.SPARSE_COIN_MAX_RATIO * height*width) + len(getDefaultWallChoices())
+        return min(height*width, placed * ChunkedGrid.TILE_SIZE**2)
+
+    def ready(self, height: int, width: int) -> int:
+        pending = self.__queues.get((height, width))
+        return 0 if pending is None else pending.qsize()
+
+    @property
+    def sizes(self) -> list[tuple[int, int]]:
+        """
+        Sizes layouts are kept ready for, least recently requested first
+        """
+        with self.__lock:
+            return list(self.__queues)
+
+    def __track(self, height: int, width: int) -> queue.Queue:
+        """
+        Returns the queue for a size, starting one if the size is new and dropping old sizes to stay in budget
+        Called with the lock held, or before the background thread starts
+        """
+        size = (height, width)
+        pending = self.__queues.get(size)
+        if pending is not None:
+            self.__queues.move_to_end(size)
+            return pending
+        depth = max(1, min(self.__depth, LayoutPool.MAX_POOLED_CELLS // LayoutPool.cells(height, width)))
+        pending = self.__queues[size] = queue.Queue(maxsize=depth)
+        self.__pooledCells += depth*LayoutPool.cells(height, width)
+        # the size just requested is kept even if it is over budget on its own
+        while self.__pooledCells > LayoutPool.MAX_POOLED_CELLS and len(self.__queues) > 1:
+            (oldHeight, oldWidth), dropped = self.__queues.popitem(last=False)
+            self.__pooledCells -= dropped.maxsize*LayoutPool.cells(oldHeight, oldWidth)
+        return pending
+
+    def __run(self):
+        while True:
+            # refill the emptiest queue first, a burst of starts on one size should not starve the others
+            with self.__lock:
+                unfilled = [(pending.qsize(), size, pending) for size, pending in self.__queues.items() if not pending.full()]
+            if not unfilled:
+                self.__wake.wait()
+                self.__wake.clear()
+                continue
+            _, (height, width), pending = min(unfilled, key=lambda entry: entry[:2])
+            sparse = LayoutPool.isSparse(height, width)
+            layout = Map(height, width, [], sparse=sparse)
+            # walls are fixed from here on, so the distance table is built once per layout, here rather than on the
+            # message thread; boards too large for all pairs keep building rows on demand, and sparse ones get none,
+            # the table keeps a byte for every cell
+            if not sparse:
+                layout.distances.fill()
+            # the queue may have been dropped while this was generated, then the layout goes with it
+            pending.put(layout)
@@ -0,0 +1,135 @@
+import json
+import time
+import heapq
+import threading
+
+from sequencing import SPECTATOR_QOS
+
+LEADERBOARD_TOPIC = 'leaderboard'
+
+
+class RankIndex:
+    # stale heap entries allowed beyond one per live key before the heap is rebuilt
+    COMPACT_SLACK = 64
+
+    def __init__(self):
+        """
+            Keys ranked by score, O(log n) per score change instead of sorting every key for each ranking
+            Changed and removed keys leave stale heap entries behind, which are skipped and dropped when seen
+        """
+        self.scores = {}
+        self.heap = []
+
+    def __len__(self):
+        return len(self.scores)
+
+    def set(self, key, score):
+        if self.scores.get(key) == score:
+            return
+        self.scores[key] = score
+        heapq.heappush(self.heap, (-score, key))
+        if len(self.heap) > 2 * len(self.scores) + RankIndex.COMPACT_SLACK:
+            self.compact()
+
+    def add(self, key, delta):
+        self.set(key, self.scores.get(key, 0) + delta)
+
+    def remove(self, key):
+        self.scores.pop(key, None)
+
+    def compact(self):
+        # linear, but it only happens after as many updates as there are keys
+        self.heap = [(-score, key) for key, score in self.scores.items()]
+        heapq.heapify(self.heap)
+
+    def top(self, k):
+        """
+            :return: [(key, score), ...] of the k highest scores, ties broken by key
+        """
+        result = []
+        kept = []
+        seen = set()
+        while self.heap and len(result) < k:
+            entry = heapq.heappop(self.heap)
+            score, key = -entry[0], entry[1]
+            # entries from before the latest change of a key, or of a removed key, are not put back
+            if key in seen or self.scores.get(key) != score:
+                continue
+            seen.add(key)
+            result.append((key, score))
+            kept.append(entry)
+        for entry in kept:
+            heapq.heappush(self.heap, entry)
+        return result
+
+
+class Leaderboard:
+    def __init__(self, k: int = 10, interval: float = 1.0):
+        """
+            Live top teams over every running lobby and within each one, fed with score changes as turns resolve
+            :param k: teams in each ranking
+            :param interval: least seconds between two publishes
+        """
+        self.k = k
+        self.interval = interval
+        # ranks (lobby, team) over all lobbies
+        self.overall = RankIndex()
+        # {lobby name: RankIndex of its teams}
+        self.lobbies = {}
+        # lobbies with changes that have not been published yet
+        self.dirty = set()
+        self.last_publish = None
+        # sends the changes held back by the throttle once the interval is up, None when nothing is held back
+        self.timer = None
+        # turns resolve on the paho thread while the timer publishes from its own
+        self.lock = threading.RLock()
+
+    def add(self, lobby, team, delta):
+        with self.lock:
+            self.overall.add((lobby, team), delta)
+            self.lobbies.setdefault(lobby, RankIndex()).add(team, delta)
+            self.dirty.add(lobby)
+
+    def end_lobby(self, lobby):
+        with self.lock:
+            ranks = self.lobbies.pop(lobby, None)
+            if ranks is None:
+                return
+            for team in ranks.scores:
+                self.overall.remove((lobby, team))
+            self.dirty.add(lobby)
+
+    def payload(self):
+        """
+            Overall ranking, and the ranking of every lobby that changed since the last publish, empty if it ended
+        """
+        with self.lock:
+            return {'top': [{'lobby': lobby, 'team': team, 'score': score} for (lobby, team), score in self.overall.top(self.k)],
+                    'lobbies': {lobby: [{'team': team, 'score': score} for team, score in self.lobbies[lobby].top(self.k)]
+                                if lobby in self.lobbies else [] for lobby in self.dirty}}
+
+    def publish_if_due(self, client, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if not self.dirty:
+                return
+            wait = 0 if self.last_publish is None else self.interval - (now - self.last_publish)
+            if wait > 0:
+                # the last change before play stops would otherwise wait for a next one that may never come
+                if self.timer is None:
+                    self.timer = threading.Timer(wait, self.flush, (client,))
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+            payload = json.dumps(self.payload())
+            self.dirty.clear()
+            self.last_publish = now
+        client.publish(LEADERBOARD_TOPIC, payload, qos=SPECTATOR_QOS)
+
+    def flush(self, client):
+        """
+            Publishes the changes the throttle held back, run by the timer publish_if_due starts
+        """
+        with self.lock:
+            self.timer = None
+        self.publish_if_due(client)
@@ -0,0 +1,88 @@
+from typing import Optional
+
+from game import Game
+from moveset import Moveset
+
+
+class Lobby:
+    __slots__ = ('name', 'teams', 'started', 'game', 'tick', 'epoch', 'slots', 'moves', 'order', 'traces')
+
+    def __init__(self, name: str):
+        """
+            Everything the server keeps about one lobby, from the first join until its game ends
+            :param name: lobby name, as in the topics
+        """
+        self.name = name
+        # {team name: [player name, ...]}, also the playerNames the game is made from
+        self.teams: dict[str, list[str]] = {}
+        self.started = False
+        self.game: Optional[Game] = None
+        # moves resolved so far, sent with every game state
+        self.tick = 0
+        # servers that took the lobby over from another, sent with every game state so players follow the new count
+        # of ticks
+        self.epoch = 0
+        # {player name: index into moves}
+        self.slots: dict[str, int] = {}
+        # move of every player for the tick in progress, None until it arrives
+        self.moves: list[Optional[Moveset]] = []
+        # slots in the order their moves arrived, which decides who gets a contested cell
+        self.order: list[int] = []
+        # {player name: trace context of their move}, for the tick in progress
+        self.traces: dict[str, dict] = {}
+
+    def add_player(self, team_name: str, player_name: str) -> bool:
+        """
+            :return: False if the player had already joined, a join delivered twice registers them once, or if the game
+            started, the moves have no slot for a player who joins later
+        """
+        if self.started or player_name in self.slots:
+            return False
+        self.slots[player_name] = len(self.slots)
+        self.teams.setdefault(team_name, []).append(player_name)
+        return True
+
+    def start(self, game: Game, tick: int = 0, epoch: int = 0):
+        """
+            :param game: game made from the roster, or restored from a snapshot that may know players the roster missed
+            :param tick: tick the game is at, above 0 for a restored one
+            :param epoch: epoch of the server the game was restored from
+        """
+        self.game = game
+        self.started = True
+        self.tick = tick
+        self.epoch = epoch
+        self.slots = {player_name: slot for slot, player_name in enumerate(game.all_players)}
+        self.moves = [None] * len(self.slots)
+        self.order = []
+        self.traces = {}
+
+    def set_move(self, player_name: str, move: Moveset, trace: Optional[dict] = None) -> bool:
+        """
+            :param trace: when the move was received and the client's trace context, echoed with the next game state
+            :return: False for a player not in the game, or one who already moved this tick, the first move is kept
+        """
+        slot = self.slots.get(player_name)
+        if slot is None or self.moves[slot] is not None:
+            return False
+        self.moves[slot] = move
+        self.order.append(slot)
+        if trace is not None:
+            self.traces[player_name] = trace
+        return True
+
+    def all_moved(self) -> bool:
+        return len(self.order) == len(self.moves)
+
+    def take_moves(self) -> tuple[list[tuple[str, Moveset]], dict[str, dict]]:
+        """
+            Clears the moves of the tick in progress
+            :return: [(player name, Moveset), ...] in the order they arrived, and {player name: trace context}
+        """
+        names = list(self.slots)
+        moves = [(names[slot], self.moves[slot]) for slot in self.order]
+        traces = self.traces
+        self.moves = [None] * len(self.moves)
+        self.order = []
+        self.traces = {}
+        return moves, traces
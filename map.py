@@ -6,6 +6,8 @@ from copy import deepcopy
 from player import Player
 import random
 from gameItems import *
+from distanceTable import DistanceTable, getDistanceTable, layoutHash
+from chunkedGrid import ChunkedGrid
 from typing import Optional
 
 def getDefaultWallChoices():
@@ -16,24 +18,40 @@ def getDefaultWallChoices():
     for col in range(2,9,2):
         wall.append((4,col))
     for row in range(0,9,2):
-        wall.append((row,8))
+        # (4,8) is already in from the row above
+        if (row,8) not in wall:
+            wall.append((row,8))
     return wall
 
 
 class Map:
     COIN_MIN_RATIO = 0.1
     COIN_MAX_RATIO = 0.2
+    # sparse maps are for huge boards that are mostly empty, at the dense ratios every tile would hold coins
+    # and the board would cost more than a dense one; at 0.01% most tiles stay unallocated
+    SPARSE_COIN_MIN_RATIO = 0.00001
+    SPARSE_COIN_MAX_RATIO = 0.0001
     WALL_MIN_RATIO = 0.1
     WALL_MAX_RATIO = 0.3
 
-    def __init__(self, height: int, width: int, playersList: list[Player], wallChoices: list[tuple[int]] = None):
+    def __init__(self, height: int, width: int, playersList: list[Player], wallChoices: list[tuple[int]] = None, sparse: bool = False):
+        """
+        :param sparse: store cells in tiles allocated only where something was placed, for huge boards that are mostly empty
+        """
         assert isinstance(width, int) and isinstance(height, int)
         assert isinstance(playersList, list)
         self.__height = height
         self.__width = width
-        self.__map: list[list[object]] = [[None for _ in range(width)] for _ in range(height)]
+        self.__sparse = sparse
+        if sparse:
+            self.__map = ChunkedGrid(height, width, None)
+        else:
+            self.__map: list[list[object]] = [[None for _ in range(width)] for _ in range(height)]
+        # rows this map may write in place, the others are still shared with a fork and get copied on first write
+        self.__ownedRows: set[int] = set() if sparse else set(range(height))
 
         self.__numCoins = 0
+        self.__walls: set[tuple[int, int]] = set()
 
         self.wallChoices = getDefaultWallChoices() if wallChoices is None else wallChoices
 
@@ -47,8 +65,88 @@ class Map:
     def decreaseCoin(self):
         self.__numCoins -= 1
 
+    def increaseCoin(self):
+        self.__numCoins += 1
+
+    def fork(self) -> 'Map':
+        """
+        Returns a copy that shares rows with this map until either of them writes to a row
+        """
+        other = Map.__new__(Map)
+        other.__height = self.__height
+        other.__width = self.__width
+        other.__sparse = self.__sparse
+        # a sparse map shares tiles the same way
+        other.__map = self.__map.fork() if self.__sparse else list(self.__map)
+        other.__numCoins = self.__numCoins
+        # walls are fixed once the map is filled, so both maps can keep the same set
+        other.__walls = self.__walls
+        other.wallChoices = self.wallChoices
+        self.__ownedRows = set()
+        other.__ownedRows = set()
+        return other
+
+    def snapshot(self) -> dict:
+        """
+        Walls and coins as plain data, players are left to the Game that owns them
+        """
+        coins = {'1': [], '2': [], '3': []}
+        for loc, cell in self.window(0, 0, self.__height - 1, self.__width - 1):
+            if isinstance(cell, Coin):
+                coins[str(cell.value)].append(loc)
+        return {'height': self.__height, 'width': self.__width, 'sparse': self.__sparse,
+                'walls': sorted(self.__walls), 'coins': coins}
+
+    @classmethod
+    def fromSnapshot(cls, data: dict) -> 'Map':
+        """
+        Rebuilds a map from snapshot(), without players
+        """
+        layout = Map.__new__(Map)
+        layout.__height = data['height']
+        layout.__width = data['width']
+        layout.__sparse = data['sparse']
+        if layout.__sparse:
+            layout.__map = ChunkedGrid(layout.__height, layout.__width, None)
+        else:
+            layout.__map = [[None for _ in range(layout.__width)] for _ in range(layout.__height)]
+        layout.__ownedRows = set() if layout.__sparse else set(range(layout.__height))
+        layout.__walls = set()
+        layout.__numCoins = 0
+        layout.wallChoices = getDefaultWallChoices()
+        for x, y in data['walls']:
+            layout.set((x, y), Wall())
+            layout.__walls.add((x, y))
+        for value, coin in (('1', Coin1), ('2', Coin2), ('3', Coin3)):
+            for x, y in data['coins'][value]:
+                layout.set((x, y), coin())
+                layout.__numCoins += 1
+        return layout
+
+    @property
+    def walls(self) -> frozenset:
+        return frozenset(self.__walls)
+
+    @property
+    def distances(self) -> DistanceTable:
+        """
+        Shortest path table over the walls of this layout, shared with every other map with the same walls
+        Layouts from a LayoutPool come with every row built for boards small enough to hold all pairs
+        """
+        return getDistanceTable(self.__height, self.__width, self.__walls)
+
+    @property
+    def layoutHash(self) -> str:
+        return layoutHash(self.__height, self.__width, self.__walls)
+
+    @property
+    def sparse(self):
+        return self.__sparse
+
     @property
     def map(self):
+        if self.__sparse:
+            return [[self.__map.get((x, y)) for y in range(self.__width)] for x in range(self.__height)]
         return deepcopy(self.__map)
 
     @property
@@ -61,7 +159,7 @@ class Map:
 
     def __repr__(self):
         result = []
-        for row in self.__map:
+        for row in (self.map if self.__sparse else self.__map):
             row_str = []
             for cell in row:
                 if cell is None:
@@ -79,12 +177,42 @@ class Map:
 
     def set(self, loc: tuple[int, int], item: object):
         assert isinstance(loc, tuple) and len(loc) == 2 and isinstance(loc[0], int) and isinstance(loc[1], int)
+        if self.__sparse:
+            self.__map.set(loc, item)
+            return
+        if loc[0] not in self.__ownedRows:
+            self.__map[loc[0]] = self.__map[loc[0]][:]
+            self.__ownedRows.add(loc[0])
         self.__map[loc[0]][loc[1]] = item
 
     def get(self, loc: tuple[int, int]):
         assert isinstance(loc, tuple) and len(loc) == 2 and isinstance(loc[0], int) and isinstance(loc[1], int)
+        if self.__sparse:
+            return self.__map.get(loc)
         return self.__map[loc[0]][loc[1]]
 
+    def window(self, minX: int, minY: int, maxX: int, maxY: int):
+        """
+        Yields (loc, item) for every occupied cell in the inclusive rectangle, clipped to the board, in row-major order
+        """
+        if self.__sparse:
+            yield from self.__map.window(minX, minY, maxX, maxY)
+            return
+        minY, maxY = max(minY, 0), min(maxY, self.__width - 1)
+        for x in range(max(minX, 0), min(maxX, self.__height - 1) + 1):
+            row = self.__map[x]
+            for y in range(minY, maxY + 1):
+                if row[y] is not None:
+                    yield (x, y), row[y]
+
+    def addPlayers(self, players: list[Player]):
+        """
+        Puts players on random free cells of a map generated without them
+        """
+        assert isinstance(players, list)
+        for player in players:
+            player.loc = self.__placeRandom(player)
+
     def __fillMap(self, players: list[Player]):
         assert isinstance(players, list)
 
@@ -99,7 +227,7 @@ class Map:
         numWalls = random.randint(minWalls, maxWalls)
         wallChoices = deepcopy(self.wallChoices)
         for _ in range(numWalls):
-            self.__placeRandom(Wall(), wallChoices)
+            self.__walls.add(self.__placeRandom(Wall(), wallChoices))
 
         # Fill players
         for player in players:
@@ -108,7 +236,12 @@ class Map:
         numPlayers = len(players)
         empty = empty - numWalls - numPlayers
 
-        self.__numCoins = random.randint(int(Map.COIN_MIN_RATIO * empty), int(Map.COIN_MAX_RATIO * empty))
+        if self.__sparse:
+            minRatio, maxRatio = Map.SPARSE_COIN_MIN_RATIO, Map.SPARSE_COIN_MAX_RATIO
+        else:
+            minRatio, maxRatio = Map.COIN_MIN_RATIO, Map.COIN_MAX_RATIO
+        # at least one coin, a game on a board this empty would otherwise be over before it starts
+        self.__numCoins = max(random.randint(int(minRatio * empty), int(maxRatio * empty)), 1)
         for _ in range(self.__numCoins):
             coin = random.choices((Coin1, Coin2, Coin3), (6,3,1))[0]()
             self.__placeRandom(coin)
@@ -120,8 +253,9 @@ class Map:
             else:
                 x, y = random.choice(choice)
                 choice.remove((x,y))
-            if self.__map[x][y] is None:
-                self.__map[x][y] = obj
+            # through set, a forked layout must copy a row it still shares before writing to it
+            if self.get((x, y)) is None:
+                self.set((x, y), obj)
                 return x, y
 
 
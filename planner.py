@@ -0,0 +1,133 @@
+import time
+
+from distanceTable import UNREACHABLE, getDistanceTable
+from chunkedGrid import ChunkedGrid
+
+directions = [
+    (-1, 0),
+    (1, 0),
+    (0, -1),
+    (0, 1),
+]
+
+direction_mapping = {
+    directions[0] : "UP",
+    directions[1] : "DOWN",
+    directions[2] : "LEFT",
+    directions[3] : "RIGHT",
+}
+
+
+class Planner:
+    # number of best single targets that are also tried as the first stop of a two coin tour
+    TOUR_CANDIDATES = 3
+    # unexplored rows and columns around the explored area that paths may cut through
+    MARGIN = 1
+    # the table's rectangle grows in steps of this many cells, aligned like the client map's tiles, so exploring
+    # a few cells further does not throw away every row built so far
+    CHUNK = ChunkedGrid.TILE_SIZE
+
+    def __init__(self, height: int, width: int):
+        """
+            Chooses coin targets by value over path length using the shared distance table for the known walls
+            The table only covers the explored part of the board, so its cost follows exploration rather than board size
+            :param height: number of rows on the board
+            :param width: number of columns on the board
+        """
+        self.height = height
+        self.width = width
+        self.table = None
+        self.walls_key = None
+        self.rect = None
+        # (min_x, min_y, max_x, max_y) of every cell seen so far
+        self.bounds = None
+        # coin the last plan headed for, None when no coin was reachable
+        self.target = None
+
+    def observe(self, min_x, min_y, max_x, max_y):
+        """
+            Grows the explored area to include the given inclusive rectangle
+        """
+        if self.bounds is None:
+            self.bounds = (min_x, min_y, max_x, max_y)
+        else:
+            b = self.bounds
+            self.bounds = (min(b[0], min_x), min(b[1], min_y), max(b[2], max_x), max(b[3], max_y))
+
+    def search_rect(self):
+        if self.bounds is None:
+            return (0, 0, self.height, self.width)
+        chunk = Planner.CHUNK
+        min_x = max((self.bounds[0] - Planner.MARGIN) // chunk * chunk, 0)
+        min_y = max((self.bounds[1] - Planner.MARGIN) // chunk * chunk, 0)
+        max_x = min(((self.bounds[2] + Planner.MARGIN) // chunk + 1) * chunk - 1, self.height - 1)
+        max_y = min(((self.bounds[3] + Planner.MARGIN) // chunk + 1) * chunk - 1, self.width - 1)
+        return (min_x, min_y, max_x - min_x + 1, max_y - min_y + 1)
+
+    def update_walls(self, walls):
+        # walls never move, so the table only changes when a new wall is seen or the explored area grows into a new chunk
+        rect = self.search_rect()
+        if rect != self.rect or self.walls_key is None or len(walls) != len(self.walls_key) or walls != self.walls_key:
+            self.rect = rect
+            self.walls_key = frozenset(walls)
+            self.table = getDistanceTable(rect[2], rect[3], self.walls_key, (rect[0], rect[1]), allPairs=False)
+
+    def plan(self, start, coins, walls, blocked, deadline):
+        """
+            Returns the next move towards the best coin, or None if no coin is reachable
+            :param start: current position of the player
+            :param coins: {cell: coin value} for every known coin
+            :param walls: set of known wall cells
+            :param blocked: cells occupied by other players this tick
+            :param deadline: time.perf_counter() value by which a decision must be made
+        """
+        self.update_walls(walls)
+        self.target = None
+        start = tuple(start)
+        from_start = self.table.row(start, deadline)
+        if from_start is None:
+            return None
+        scored = []
+        for coin, value in coins.items():
+            index = self.table.index(coin)
+            dist = UNREACHABLE if index is None else from_start[index]
+            if dist > 0:
+                scored.append((value / dist, coin, dist))
+        if len(scored) == 0:
+            return None
+        scored.sort(reverse=True)
+
+        # a short tour can beat the best single coin, e.g. a Coin1 on the way to a Coin3
+        best_score, best_target, _ = scored[0]
+        for _, first, first_dist in scored[:Planner.TOUR_CANDIDATES]:
+            if time.perf_counter() > deadline:
+                break
+            from_first = self.table.row(first, deadline)
+            if from_first is None:
+                break
+            for _, second, _ in scored:
+                leg = from_first[self.table.index(second)]
+                if second == first or leg == UNREACHABLE:
+                    continue
+                score = (coins[first] + coins[second]) / (first_dist + leg)
+                if score > best_score:
+                    best_score, best_target = score, first
+        self.target = best_target
+        return self.step_towards(start, best_target, blocked, deadline)
+
+    def step_towards(self, start, target, blocked, deadline):
+        to_target = self.table.row(target, deadline)
+        if to_target is None:
+            return None
+        best = None
+        for d in directions:
+            neighbor = (start[0]+d[0], start[1]+d[1])
+            index = self.table.index(neighbor)
+            if neighbor in blocked or index is None:
+                continue
+            dist = to_target[index]
+            if dist != UNREACHABLE and (best is None or dist < best[0]):
+                best = (dist, d)
+        if best is None:
+            return None
+        return direction_mapping[best[1]]
@@ -0,0 +1,260 @@
+import json
+import random
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from moveset import Moveset
+from planner import Planner, directions, direction_mapping
+from frontier import Frontier
+from chunkedGrid import ChunkedGrid
+from vision import Vision
+
+# seconds a bot may spend choosing a move each turn
+DECISION_BUDGET = 0.2
+
+# every policy that can be picked by name, filled by register_policy
+POLICIES = {}
+
+
+def register_policy(name: str):
+    """
+        Class decorator that makes a Policy subclass available under the given name
+    """
+    def register(cls):
+        POLICIES[name] = cls
+        return cls
+    return register
+
+
+def make_policy(name: str, player_name: str, height: int = 10, width: int = 10):
+    try:
+        return POLICIES[name](player_name, height, width)
+    except KeyError:
+        raise KeyError(f'{name} is not a registered policy, choose one of {sorted(POLICIES)}')
+
+
+class Policy(ABC):
+    def __init__(self, player_name: str, height: int = 10, width: int = 10):
+        """
+            Decides one player's moves from the game states sent by the server
+            :param player_name: name the bot joined the lobby with
+            :param height: number of rows on the board
+            :param width: number of columns on the board
+        """
+        self.player_name = player_name
+        # best move found so far for the decision in progress, returned if the deadline passes first
+        self.best = None
+        # set to a TeamCoordinator to split coins with teammates
+        self.coordinator = None
+        # cells each game state covers, replaced by what the server announces at game start
+        self.vision = Vision()
+        self.set_dimensions(height, width)
+
+    def set_dimensions(self, height: int, width: int):
+        """
+            Forgets the board and starts over on one of the given size, as announced by the server at game start
+        """
+        self.height = height
+        self.width = width
+
+    def set_vision(self, vision: Vision):
+        self.vision = vision
+
+    @abstractmethod
+    def decide(self, observation: dict, deadline: float) -> Moveset:
+        """
+            :param observation: game state for this player as sent by the server
+            :param deadline: time.perf_counter() value by which a decision must be made, heavier policies should
+                             update self.best as they go and return once it passes
+        """
+        ...
+
+    def quick_move(self, observation: dict) -> Moveset:
+        """
+            Cheap move used when there is no time left to decide, must not touch state that decide uses
+        """
+        x, y = observation["currentPosition"]
+        occupied = set(tuple(pos) for pos in observation["walls"] + observation["teammatePositions"] + observation["enemyPositions"])
+        options = [move for move in Moveset
+                   if 0 <= x + move.value[0] < self.height and 0 <= y + move.value[1] < self.width
+                   and (x + move.value[0], y + move.value[1]) not in occupied]
+        return random.choice(options) if options else Moveset.UP
+
+    def intent_payload(self):
+        """
+            Returns the intent to publish on the team topic after a move was decided
+        """
+        return None
+
+
+class PolicyRunner:
+    def __init__(self, policy: Policy):
+        """
+            Runs a policy's decisions on a worker thread so a slow decision never misses the deadline
+        """
+        self.policy = policy
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.running = None
+
+    def decide(self, observation: dict, budget: float = DECISION_BUDGET) -> Moveset:
+        deadline = time.perf_counter() + budget
+        if self.running is not None and not self.running.done():
+            # the last decision overran and is still finishing, don't queue another one behind it
+            return self.policy.quick_move(observation)
+        self.policy.best = None
+        self.running = self.executor.submit(self.policy.decide, observation, deadline)
+        try:
+            return self.running.result(timeout=max(deadline - time.perf_counter(), 0))
+        except TimeoutError:
+            best = self.policy.best
+            return best if best is not None else self.policy.quick_move(observation)
+
+    def call(self, fn, *args):
+        """
+            Queues fn to run on the worker after the decision in progress, so a decision that overran never sees the
+            policy change under it, returns at once so the paho thread can hand over map, vision and intent updates
+        """
+        return self.executor.submit(fn, *args)
+
+    def intent_payload(self):
+        """
+            The policy's intent after its last decision, None while that decision is still finishing past its deadline
+        """
+        if self.running is not None and not self.running.done():
+            return None
+        return self.executor.submit(self.policy.intent_payload).result()
+
+
+@register_policy("random")
+class RandomPolicy(Policy):
+    def decide(self, observation, deadline):
+        return self.quick_move(observation)
+
+
+@register_policy("planner")
+class AIPlayer(Policy):
+    def __init__(self, player_name: str, height: int = 10, width: int = 10):
+        """
+            Holds everything one bot remembers between turns, so several bots can share a process
+            :param player_name: name the bot joined the lobby with
+            :param height: number of rows on the board
+            :param width: number of columns on the board
+        """
+        self.game_state = None
+        self.dir = directions[0]
+        super().__init__(player_name, height, width)
+
+    def set_dimensions(self, height: int, width: int):
+        super().set_dimensions(height, width)
+        # only tiles the bot has seen are allocated, so large boards cost what has been explored
+        self.game_map = ChunkedGrid(height, width, "N")
+        self.coins = {}
+        self.walls = set()
+        self.planner = Planner(height, width)
+        self.frontier = Frontier(height, width)
+
+    def construct_map(self):
+        game_state = self.game_state
+        game_map = self.game_map
+        # get game position info
+        player_pos = game_state["currentPosition"]
+        obstacle_pos = game_state["walls"] + game_state["teammatePositions"] + game_state["enemyPositions"]
+        coin_pos = game_state["coin1"] + game_state["coin2"] + game_state["coin3"]
+        # calculate coordinates near player, behind walls seen now or before if the server hides those
+        player_x, player_y = player_pos[0], player_pos[1]
+        walls_now = set(tuple(pos) for pos in game_state["walls"])
+        visible = self.vision.visibleCells((player_x, player_y), self.height, self.width,
+                                           lambda loc: loc in walls_now or loc in self.walls)
+        min_x = min(x for x, _ in visible)
+        max_x = max(x for x, _ in visible)
+        min_y = min(y for _, y in visible)
+        max_y = max(y for _, y in visible)
+        # reset space near player, forgetting coins that were picked up
+        for loc in visible:
+            game_map.set(loc, "N")
+            self.coins.pop(loc, None)
+        # place player
+        game_map.set((player_x, player_y), "P")
+        # place obstacles
+        for pos in obstacle_pos:
+            game_map.set((pos[0], pos[1]), "O")
+        # place coins
+        for pos in coin_pos:
+            game_map.set((pos[0], pos[1]), "C")
+        # remember walls and coin values for the planner
+        for value, key in enumerate(("coin1", "coin2", "coin3"), start=1):
+            for pos in game_state[key]:
+                self.coins[(pos[0], pos[1])] = value
+        for pos in game_state["walls"]:
+            self.walls.add((pos[0], pos[1]))
+        self.frontier.update(visible, self.walls)
+        self.planner.observe(min_x, min_y, max_x, max_y)
+
+    def valid_coord(self, x, y):
+        return (x >= 0 and x < self.height) and (y >= 0 and y < self.width)
+
+    def decide(self, observation, deadline):
+        self.game_state = observation
+        return Moveset[self.make_move(deadline)]
+
+    def make_move(self, deadline=None):
+        """
+            Updates the map from the latest game state and returns the move to publish
+            :param deadline: time.perf_counter() value by which a decision must be made, defaults to DECISION_BUDGET from now
+        """
+        if deadline is None:
+            deadline = time.perf_counter() + DECISION_BUDGET
+        # update the map with the current game state
+        self.construct_map()
+        # get player's current position
+        player_pos = self.game_state["currentPosition"]
+        start_node = (player_pos[0], player_pos[1])
+        # head for the coin (or pair of coins) with the best value per step
+        blocked = set(tuple(pos) for pos in self.game_state["teammatePositions"] + self.game_state["enemyPositions"])
+        coins = self.coins
+        if self.coordinator is not None:
+            # leave coins a teammate is better placed to collect
+            self.planner.update_walls(self.walls)
+            coins = self.coordinator.assign(start_node, coins, self.planner.table, self.game_state.get("tick"))
+        new_move = self.planner.plan(start_node, coins, self.walls, blocked, deadline)
+        if new_move:
+            self.best = Moveset[new_move]
+        # if no coin is found, head for the nearest edge of the explored area
+        if not new_move:
+            target = self.frontier.target(start_node, self.planner.table)
+            if target is not None:
+                new_move = self.planner.step_towards(start_node, target, blocked, deadline)
+        # with nothing left to explore, move in one direction until agent hits a wall, then switch direction
+        if not new_move:
+            new_move = self.gen_random_move(player_pos)
+        return new_move
+
+    def gen_random_move(self, pos):
+        x = pos[0] + self.dir[0]
+        y = pos[1] + self.dir[1]
+        # if neighboring cell in the current direction is not a valid move, give up once every direction was tried
+        turns = 0
+        while (not self.valid_coord(x, y) or self.game_map.get((x, y)) == "O") and turns < len(directions):
+            turns += 1
+            # choose new direction in a counter-clockwise manner
+            if direction_mapping[self.dir] == "UP":
+                self.dir = directions[2]
+            elif direction_mapping[self.dir] == "DOWN":
+                self.dir = directions[3]
+            elif direction_mapping[self.dir] == "LEFT":
+                self.dir = directions[1]
+            elif direction_mapping[self.dir] == "RIGHT":
+                self.dir = directions[0]
+            x = pos[0] + self.dir[0]
+            y = pos[1] + self.dir[1]
+        return direction_mapping[self.dir]
+
+    def intent_payload(self):
+        """
+            Returns the intent to publish on the team topic after a move was decided
+        """
+        # nothing to announce before the first decision, a bot that only had time for quick moves has no plan yet
+        if self.game_state is None:
+            return None
+        return self.coordinator.intent_payload(self.game_state["currentPosition"], self.planner.target, self.coins)
@@ -0,0 +1,255 @@
+import os
+import re
+import sys
+import time
+import pstats
+import random
+import signal
+import cProfile
+import contextlib
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_TOPIC = 'admin/profile'
+PROFILE_DIR = 'profiles'
+# the profiler's own bookkeeping is not what anyone is looking for
+IGNORED_ALLOCATIONS = (tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, contextlib.__file__),
+                       tracemalloc.Filter(False, tracemalloc.__file__))
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    # root first, the format flamegraph.pl and speedscope read
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    INTERVAL = 0.0002
+
+    def __init__(self):
+        """
+            Samples the stack of one thread while it handles a profiled message, for flame graphs
+            cProfile only records caller and callee pairs, which cannot be put back together into whole stacks
+            The sampler only runs when the handling thread lets go of the GIL, every 5ms by default, so messages
+            that take less than that show up in the flame graph over many messages rather than in each one.
+            Lowering sys.setswitchinterval would sample more finely, but it applies to every thread of the server
+            for as long as it is set, so it is left alone
+        """
+        self.thread_id = None
+        self.stacks = None
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="StackSampler", daemon=True)
+        self.thread.start()
+
+    def start(self, stacks: Counter):
+        self.stacks = stacks
+        self.thread_id = threading.get_ident()
+        self.wake.set()
+
+    def stop(self):
+        self.wake.clear()
+        self.thread_id = None
+
+    def run(self):
+        while True:
+            self.wake.wait()
+            thread_id, stacks = self.thread_id, self.stacks
+            frame = sys._current_frames().get(thread_id) if thread_id is not None else None
+            if frame is not None:
+                stacks[collapse(frame)] += 1
+            time.sleep(StackSampler.INTERVAL)
+
+
+class Session:
+    def __init__(self, name: str, ticks: int):
+        """
+            Everything collected for one profiling request, aggregated over all the messages it covered
+            :param name: lobby name, or 'sampled' for messages sampled from every lobby
+            :param ticks: messages to profile before the results are dumped
+        """
+        self.name = name
+        self.remaining = ticks
+        self.profile = cProfile.Profile()
+        self.stacks = Counter()
+        # allocations when the session's first message started, what finish() compares against
+        self.baseline = None
+        self.peak = 0
+        self.ticks = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+
+
+class TickProfiler:
+    DEFAULT_TICKS = 100
+    # fraction of messages profiled when sampling is switched on by signal
+    SIGNAL_SAMPLE_RATE = 0.01
+    TOP_ALLOCATIONS = 50
+    TOP_FUNCTIONS = 50
+
+    def __init__(self, directory: str = PROFILE_DIR):
+        """
+            Opt-in profiling of message handling, for one lobby at a time or a sample of every lobby's messages
+            Nothing is traced while it is off, so lobbies run at full speed until someone asks; while a session is
+            running tracemalloc is on for the whole process, which slows the allocations of every lobby
+            :param directory: where the results are dumped
+        """
+        self.directory = directory
+        # {lobby name: Session}, every message of these lobbies is profiled
+        self.lobbies = {}
+        self.sample_rate = 0.0
+        self.sampled = None
+        # set by the signal handler and applied before the next message, a handler may run in the middle of one
+        self.pending = None
+        self.profiling = False
+        self.sampler = None
+        # tracemalloc was started here, rather than by someone else, and is stopped once no session is left
+        self.tracing = False
+
+    def install_signal_handler(self):
+        """
+            SIGUSR1 toggles sampling of every lobby, without needing access to the admin topic
+        """
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self.on_signal)
+
+    def on_signal(self, signum, frame):
+        if self.sampled is None:
+            self.pending = {'sample': TickProfiler.SIGNAL_SAMPLE_RATE}
+        else:
+            self.pending = {'stop': True}
+
+    def command(self, request: dict):
+        """
+            {'lobby': name, 'ticks': n} profiles the next n messages of a lobby
+            {'sample': rate, 'ticks': n} profiles a fraction of the messages of every lobby until n were profiled
+            {'stop': true} dumps and ends every session, or only the lobby's when a lobby is given
+        """
+        ticks = int(request.get('ticks', TickProfiler.DEFAULT_TICKS))
+        lobby = request.get('lobby')
+        if request.get('stop'):
+            if lobby is not None:
+                self.finish(self.lobbies.pop(lobby, None))
+            else:
+                for session in self.lobbies.values():
+                    self.finish(session)
+                self.lobbies.clear()
+                self.finish(self.sampled)
+                self.sampled = None
+                self.sample_rate = 0.0
+        elif lobby is not None:
+            self.lobbies.setdefault(lobby, Session(lobby, ticks)).remaining = ticks
+            print(f"Profiling the next {ticks} messages of lobby {lobby}")
+        elif 'sample' in request:
+            self.sample_rate = float(request['sample'])
+            if self.sampled is None:
+                self.sampled = Session('sampled', ticks)
+            self.sampled.remaining = ticks
+            print(f"Profiling {self.sample_rate:.2%} of all messages, {ticks} in total")
+        self.stop_tracing_if_idle()
+
+    def session_for(self, lobby):
+        if self.pending is not None:
+            request, self.pending = self.pending, None
+            self.command(request)
+        # fast path, nothing was asked for
+        if not self.lobbies and self.sampled is None:
+            return None
+        session = self.lobbies.get(lobby)
+        if session is None and self.sampled is not None and random.random() < self.sample_rate:
+            session = self.sampled
+        return session
+
+    @contextmanager
+    def profile(self, lobby):
+        """
+            Profiles the enclosed message handling if its lobby is being profiled or it was sampled
+            :param lobby: lobby the message belongs to, or None
+        """
+        session = self.session_for(lobby)
+        # a profiler is already running around this call, nesting them would count its time twice
+        if session is None or self.profiling:
+            yield
+            return
+
+        if self.sampler is None:
+            self.sampler = StackSampler()
+        self.profiling = True
+        if session.baseline is None:
+            # traced for the whole session rather than per message, so every message does not pay for starting
+            # tracemalloc and snapshotting the heap, while it runs every allocation of the process costs more
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.tracing = True
+            session.baseline = tracemalloc.take_snapshot().filter_traces(IGNORED_ALLOCATIONS)
+        tracemalloc.reset_peak()
+        self.sampler.start(session.stacks)
+        start = time.perf_counter()
+        session.profile.enable()
+        try:
+            yield
+        finally:
+            session.profile.disable()
+            elapsed = time.perf_counter() - start
+            self.sampler.stop()
+            session.peak = max(session.peak, tracemalloc.get_traced_memory()[1])
+            self.profiling = False
+            session.ticks += 1
+            session.seconds += elapsed
+            session.slowest = max(session.slowest, elapsed)
+            session.remaining -= 1
+            if session.remaining <= 0:
+                self.expire(session)
+
+    def expire(self, session):
+        if session is self.sampled:
+            self.sampled = None
+            self.sample_rate = 0.0
+        else:
+            self.lobbies.pop(session.name, None)
+        self.finish(session)
+        self.stop_tracing_if_idle()
+
+    def stop_tracing_if_idle(self):
+        if self.tracing and not self.lobbies and self.sampled is None:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def finish(self, session):
+        """
+            Writes <name>-<time>.prof for pstats or snakeviz, .collapsed for flame graphs and .txt with a readable summary
+        """
+        if session is None or session.ticks == 0:
+            return
+        # what the session's messages allocated and had not freed by its end, messages of other lobbies
+        # handled in between count too since tracing is on for the whole process
+        growth = tracemalloc.take_snapshot().filter_traces(IGNORED_ALLOCATIONS).compare_to(session.baseline, 'lineno')
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r'[^\w.-]', '_', session.name)
+        base = os.path.join(self.directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+        session.profile.dump_stats(base + '.prof')
+        with open(base + '.collapsed', 'w') as f:
+            for stack, count in session.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(base + '.txt', 'w') as f:
+            f.write(f"{session.ticks} messages, {session.seconds * 1000 / session.ticks:.3f} ms mean, "
+                    f"{session.slowest * 1000:.3f} ms slowest, {session.peak} B peak traced memory\n\n")
+            f.write("Allocations made during the session and still held at its end, by site\n")
+            for stat in sorted(growth, key=lambda stat: stat.size_diff, reverse=True)[:TickProfiler.TOP_ALLOCATIONS]:
+                if stat.size_diff <= 0:
+                    break
+                site = f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}"
+                f.write(f"{stat.size_diff:12d} B {stat.count_diff:8d} blocks  {site}\n")
+            f.write("\n")
+            pstats.Stats(session.profile, stream=f).sort_stats('cumulative').print_stats(TickProfiler.TOP_FUNCTIONS)
+        print(f"Profile of {session.name} written to {base}.*")
@@ -0,0 +1,96 @@
+import sys
+
+# ANSI escape sequences, rows and columns are 1-based
+CLEAR_SCREEN = "\x1b[2J"
+CLEAR_BELOW = "\x1b[J"
+CLEAR_LINE = "\x1b[2K"
+
+
+def move_cursor(row, col):
+    return f"\x1b[{row};{col}H"
+
+
+class TerminalRenderer:
+    CELL_WIDTH = 8
+    # rows or columns between the player and the edge of the view before it scrolls
+    SCROLL_MARGIN = 2
+
+    def __init__(self, view_height: int = 11, view_width: int = 11, out=sys.stdout):
+        """
+            Draws the part of the board around the player, rewriting only the cells that changed since the last frame
+            :param view_height: board rows shown at once
+            :param view_width: board columns shown at once
+            :param out: stream the escape sequences are written to
+        """
+        self.view_height = view_height
+        self.view_width = view_width
+        self.out = out
+        # board cells written since the last draw
+        self.dirty = set()
+        # {(screen row, screen column): text} currently on screen
+        self.frame = {}
+        self.origin = None
+        self.scores = {}
+        self.score_line = None
+
+    def mark(self, loc):
+        self.dirty.add(loc)
+
+    def set_scores(self, scores: dict):
+        self.scores = scores
+
+    def view_origin(self, center, height, width):
+        # keep the view still while the player is away from its edges, since scrolling redraws every cell
+        if self.origin is not None:
+            row, col = center[0] - self.origin[0], center[1] - self.origin[1]
+            margin = TerminalRenderer.SCROLL_MARGIN
+            if (margin <= row < self.view_height - margin or height <= self.view_height) and \
+                    (margin <= col < self.view_width - margin or width <= self.view_width):
+                return self.origin
+        # otherwise centre the player, without showing space past the edge of the board
+        x = min(max(center[0] - self.view_height // 2, 0), max(height - self.view_height, 0))
+        y = min(max(center[1] - self.view_width // 2, 0), max(width - self.view_width, 0))
+        return x, y
+
+    def format_cell(self, value):
+        text = "." if value == "None" else value
+        return text[:TerminalRenderer.CELL_WIDTH - 1].ljust(TerminalRenderer.CELL_WIDTH)
+
+    def draw(self, game_map, center):
+        """
+            Writes the changes since the last frame and leaves the cursor under the board for prompts
+            :param game_map: ChunkedGrid of cell names
+            :param center: current position of the player
+        """
+        height = min(self.view_height, game_map.height)
+        width = min(self.view_width, game_map.width)
+        origin = self.view_origin(center, game_map.height, game_map.width)
+        buf = []
+        if origin != self.origin:
+            # the view scrolled, so every visible cell has to be drawn again
+            buf.append(CLEAR_SCREEN)
+            self.frame.clear()
+            self.score_line = None
+            self.origin = origin
+            cells = [(origin[0] + i, origin[1] + j) for i in range(height) for j in range(width)]
+        else:
+            cells = [loc for loc in self.dirty
+                     if 0 <= loc[0] - origin[0] < height and 0 <= loc[1] - origin[1] < width]
+        self.dirty.clear()
+
+        for loc in cells:
+            # row 1 holds the score bar
+            pos = (loc[0] - origin[0] + 2, (loc[1] - origin[1]) * TerminalRenderer.CELL_WIDTH + 1)
+            text = self.format_cell(game_map.get(loc))
+            if self.frame.get(pos) != text:
+                self.frame[pos] = text
+                buf.append(move_cursor(*pos) + text)
+
+        score_line = "  ".join(f"{team}: {score}" for team, score in sorted(self.scores.items(), key=lambda item: -item[1]))
+        if score_line != self.score_line:
+            self.score_line = score_line
+            buf.append(move_cursor(1, 1) + CLEAR_LINE + score_line)
+
+        buf.append(move_cursor(height + 3, 1) + CLEAR_BELOW)
+        self.out.write("".join(buf))
+        self.out.flush()
@@ -0,0 +1,122 @@
+import json
+from typing import Optional
+
+from game import Game
+from lobby import Lobby
+from moveset import Moveset
+from sequencing import GAME_QOS
+
+# every event goes to one topic, so the standby sees them in the order the primary made them
+REPLICATION_TOPIC = 'replication/events'
+# lobby names whose replica missed events, the primary answers each with a snapshot
+SNAPSHOT_REQUEST_TOPIC = 'replication/snapshot_requests'
+# retained 'online' while a primary runs, 'offline' from its will if it dies, 'handover' when it stops on purpose
+PRIMARY_TOPIC = 'replication/primary'
+# the broker publishes the will after 1.5 keepalives without hearing from the primary
+PRIMARY_KEEPALIVE = 5
+
+
+class ReplicationPublisher:
+    # ticks between full snapshots of a game, a standby that missed events is back in sync by the next one
+    SNAPSHOT_EVERY = 50
+
+    def __init__(self, client, enabled: bool = False):
+        """
+            Streams what the primary does to every running lobby, for a standby to replay
+            :param client: the primary's client
+            :param enabled: nothing is built or published unless a standby is meant to follow, every tick costs a publish
+                            and every SNAPSHOT_EVERY ticks a snapshot of the whole game
+        """
+        self.client = client
+        self.enabled = enabled
+
+    def publish(self, event: dict):
+        if not self.enabled:
+            return
+        # events are numbered and applied idempotently, a redelivered one is ignored by the standby
+        self.client.publish(REPLICATION_TOPIC, json.dumps(event), qos=GAME_QOS)
+
+    def player_added(self, lobby_name, team_name, player_name):
+        self.publish({'type': 'player', 'lobby': lobby_name, 'team': team_name, 'player': player_name})
+
+    def game_started(self, lobby: Lobby):
+        self.snapshot(lobby, 'start')
+
+    def tick(self, lobby: Lobby, moves: list):
+        """
+            :param lobby: lobby whose tick the moves resolved into, the one the players' next states carry
+            :param moves: [(player name, Moveset), ...] in the order they were resolved, which decides who gets a contested cell
+        """
+        if not self.enabled:
+            return
+        self.publish({'type': 'tick', 'lobby': lobby.name, 'tick': lobby.tick, 'moves': [[player, move.name] for player, move in moves]})
+        if lobby.tick % ReplicationPublisher.SNAPSHOT_EVERY == 0:
+            self.snapshot(lobby)
+
+    def snapshot(self, lobby: Lobby, kind: str = 'snapshot'):
+        """
+            Publishes the whole game, every SNAPSHOT_EVERY ticks and whenever the standby asks for one
+        """
+        if not self.enabled:
+            return
+        self.publish({'type': kind, 'lobby': lobby.name, 'tick': lobby.tick, 'epoch': lobby.epoch, 'game': lobby.game.snapshot()})
+
+    def game_ended(self, lobby_name):
+        self.publish({'type': 'end', 'lobby': lobby_name})
+
+
+class Standby:
+    def __init__(self):
+        """
+            Warm replicas of the primary's lobbies and games, kept up to date from its replication events
+        """
+        # {lobby name: Lobby}
+        self.lobbies = {}
+        # lobbies a snapshot was asked for and has not arrived yet, so a gap is asked about once
+        self.requested = set()
+
+    def apply(self, event: dict) -> Optional[str]:
+        """
+            :return: name of the lobby if its replica missed events and the primary should send a snapshot, else None
+        """
+        lobby_name = event['lobby']
+        kind = event['type']
+        if kind == 'player':
+            self.lobbies.setdefault(lobby_name, Lobby(lobby_name)).add_player(event['team'], event['player'])
+        elif kind in ('start', 'snapshot'):
+            lobby = self.lobbies.setdefault(lobby_name, Lobby(lobby_name))
+            # a redelivered start or snapshot must not roll the replica back past ticks applied since
+            if lobby.started and (event['epoch'], event['tick']) < (lobby.epoch, lobby.tick):
+                return None
+            # a snapshot replaces the replica outright, which also repairs one that missed events
+            lobby.start(Game.fromSnapshot(event['game']), event['tick'], event['epoch'])
+            self.requested.discard(lobby_name)
+        elif kind == 'tick':
+            lobby = self.lobbies.get(lobby_name)
+            if lobby is not None and lobby.started and event['tick'] <= lobby.tick:
+                # redelivered
+                return None
+            if lobby is None or not lobby.started or event['tick'] != lobby.tick + 1:
+                # the start or a tick was missed, without a snapshot the replica would stay where it is until the next
+                # periodic one, and a takeover before then would resume the game behind the players
+                if lobby_name in self.requested:
+                    return None
+                self.requested.add(lobby_name)
+                return lobby_name
+            for player, move in event['moves']:
+                lobby.game.movePlayer(player, Moveset[move])
+            lobby.tick = event['tick']
+        elif kind == 'end':
+            self.lobbies.pop(lobby_name, None)
+            self.requested.discard(lobby_name)
+        return None
+
+    def take_over(self, client):
+        """
+            Hands the replicas to client, which then serves the lobbies as the primary did
+            Moves of the tick in progress were never replicated, the caller resends every player's state so they move again
+            A replica may be behind the ticks players have seen, the new epoch tells them to follow its ticks anyway
+        """
+        for lobby in self.lobbies.values():
+            lobby.epoch += 1
+        client.lobbies = self.lobbies
@@ -0,0 +1,94 @@
+import json
+from typing import Optional
+
+# moves and states carry tick numbers and are handled idempotently, so at-least-once delivery is enough
+GAME_QOS = 1
+# scores and rankings are superseded by the next publish, a lost one does not matter
+SPECTATOR_QOS = 0
+
+NEW = 'new'
+REPEAT = 'repeat'
+STALE = 'stale'
+
+
+def move_payload(move: str, tick) -> str:
+    """
+        :param move: Moveset name
+        :param tick: tick of the game state the move answers, None for servers that do not number states
+    """
+    if tick is None:
+        return move
+    return json.dumps({'move': move, 'tick': tick})
+
+
+def parse_move(payload: bytes):
+    """
+        :return: (move, tick), tick is None for a bare move from a client that does not number its moves
+    """
+    text = payload.decode()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text, None
+    if isinstance(data, dict):
+        return data.get('move'), data.get('tick')
+    return text, None
+
+
+def start_payload(board_size=None, vision=None) -> str:
+    """
+        :param board_size: HEIGHTxWIDTH to ask the server for, e.g. "20x30", None for the server's default size
+        :param vision: SHAPE:RADIUS[:los] every player sees with, e.g. "circle:4:los", None for the server's default
+    """
+    return " ".join(["START"] + [option for option in (board_size, vision) if option is not None])
+
+
+class StateSequencer:
+    def __init__(self):
+        """
+            Tells a player's new game states from redelivered or outdated ones, and remembers the move sent for the latest
+        """
+        self.epoch = None
+        self.tick = None
+        self.sent = None
+
+    def receive(self, state: dict) -> str:
+        """
+            :return: NEW for a state to act on, REPEAT for the latest state again, STALE for an older one or one from a
+            server that has since been taken over from
+        """
+        tick = state.get('tick')
+        if tick is None:
+            return NEW
+        # a server that took over may resume below the tick the one it replaced reached, its states carry a higher
+        # epoch and the ticks are counted again from there
+        epoch = state.get('epoch', 0)
+        if self.epoch is not None and epoch != self.epoch:
+            if epoch < self.epoch:
+                return STALE
+            self.tick = None
+            self.sent = None
+        self.epoch = epoch
+        if self.tick is not None and tick < self.tick:
+            return STALE
+        if tick == self.tick:
+            return REPEAT
+        self.tick = tick
+        return NEW
+
+    def record(self, tick, payload: str, trace_id: Optional[str] = None):
+        """
+            :param tick: tick of the state the move was decided on, a newer state may have arrived while deciding
+            :param trace_id: trace id the move was sent with, so a resent move is traced like the first one
+        """
+        self.sent = (tick, payload, trace_id)
+
+    def resend(self) -> Optional[tuple[str, Optional[str]]]:
+        """
+            :return: (payload, trace id) of the move already sent for the latest state, or None if none was sent yet
+            Sending it again is safe, the server ignores a second move for the same tick. It is how a player whose move
+            went to a server that then failed gets it to the one that took over
+        """
+        if self.sent is not None and self.sent[0] == self.tick:
+            return self.sent[1], self.sent[2]
+        return None
@@ -30,3 +30,7 @@ class Team:
     def increaseScore(self, value: int):
         assert isinstance(value, int)
         self.__score += value
+
+    def decreaseScore(self, value: int):
+        assert isinstance(value, int)
+        self.__score -= value
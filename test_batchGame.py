@@ -0,0 +1,22 @@
+import pytest
+
+from batchGame import checkEquivalence
+
+ROSTERS = [
+    {'TeamA': ['Charles', 'Girish'], 'TeamB': ['James', 'Jane']},
+    {'TeamA': ['Charles'], 'TeamB': ['James']},
+    # uneven teams, and more of them than the server usually sees
+    {'TeamA': ['a1', 'a2', 'a3'], 'TeamB': ['b1'], 'TeamC': ['c1', 'c2']},
+    {'Solo': ['Charles', 'Girish', 'James']},
+]
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('playerNames', ROSTERS, ids=lambda roster: '-'.join(f'{team}{len(players)}' for team, players in roster.items()))
+def test_batch_matches_game(playerNames, seed):
+    checkEquivalence(playerNames, batchSize=16, ticks=100, seed=seed)
+
+
+@pytest.mark.parametrize('visionRadius', [1, 4])
+def test_batch_matches_game_vision(visionRadius):
+    checkEquivalence(ROSTERS[0], batchSize=16, ticks=100, visionRadius=visionRadius, seed=3)
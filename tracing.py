@@ -0,0 +1,92 @@
+import time
+import uuid
+from typing import Optional
+
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+
+# MQTTv5 user property names, every time is microseconds since the epoch on the clock of whoever stamped it
+TRACE_ID = 'trace-id'
+SENT = 'sent'
+RECEIVED = 'received'
+ALL_IN = 'all-in'
+RESOLVED = 'resolved'
+PUBLISHED = 'published'
+LAST_PLAYER = 'last-player'
+TICK_TIMES = (RECEIVED, ALL_IN, RESOLVED, PUBLISHED)
+
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def make_properties(context: dict) -> Properties:
+    properties = Properties(PacketTypes.PUBLISH)
+    properties.UserProperty = [(key, str(value)) for key, value in context.items()]
+    return properties
+
+
+def read_context(properties) -> dict:
+    """
+        :param properties: msg.properties, None for messages that came over MQTTv3
+        :return: {name: value} of the user properties, empty if there are none
+    """
+    return dict(getattr(properties, 'UserProperty', None) or [])
+
+
+def move_properties(trace_id: str) -> Properties:
+    """
+        Stamped on a move just before it is published
+    """
+    return make_properties({TRACE_ID: trace_id, SENT: now_us()})
+
+
+def move_context(properties, received: int) -> dict:
+    """
+        :param received: when the server got the move
+        :return: when the move was received, with the client's trace id and send time if it sent them
+    """
+    context = read_context(properties)
+    if TRACE_ID not in context:
+        return {RECEIVED: received}
+    return {TRACE_ID: context[TRACE_ID], SENT: context.get(SENT, ''), RECEIVED: received}
+
+
+def breakdown(context: dict, arrived: int) -> Optional[dict]:
+    """
+        Splits the time from sending a move until the game state it led to arrived, in milliseconds
+        total and server are each measured on one clock, so broker is exact too. up and down compare the client's clock
+        with the server's and are only as good as the two are in sync
+        :param context: user properties of the game state
+        :param arrived: when the client got the game state
+        :return: None unless the state answers a traced move
+    """
+    if TRACE_ID not in context:
+        return None
+    try:
+        sent = int(context[SENT])
+        received, all_in, resolved, published = (int(context[key]) for key in TICK_TIMES)
+    except (KeyError, ValueError):
+        return None
+    total = arrived - sent
+    server = published - received
+    return {'trace': context[TRACE_ID],
+            'total': total / 1000,
+            'broker': (total - server) / 1000,
+            'up': (received - sent) / 1000,
+            'down': (arrived - published) / 1000,
+            'waiting': (all_in - received) / 1000,
+            'resolve': (resolved - all_in) / 1000,
+            'publish': (published - resolved) / 1000,
+            'last_player': context.get(LAST_PLAYER)}
+
+
+def format_breakdown(times: dict) -> str:
+    return (f"trace {times['trace']}: {times['total']:.1f}ms = "
+            f"broker {times['broker']:.1f}ms (up {times['up']:.1f} / down {times['down']:.1f}) + "
+            f"waiting {times['waiting']:.1f}ms for {times['last_player']} + "
+            f"resolve {times['resolve']:.1f}ms + publish {times['publish']:.1f}ms")
@@ -0,0 +1,137 @@
+from functools import lru_cache
+from typing import Callable
+
+SQUARE = 'square'
+DIAMOND = 'diamond'
+CIRCLE = 'circle'
+SHAPES = (SQUARE, DIAMOND, CIRCLE)
+
+
+def inShape(shape: str, radius: int, dx: int, dy: int) -> bool:
+    if shape == SQUARE:
+        return max(abs(dx), abs(dy)) <= radius
+    if shape == DIAMOND:
+        return abs(dx) + abs(dy) <= radius
+    # half a cell of slack, without it small circles come out as diamonds with single cells poking out
+    return dx * dx + dy * dy <= (radius + 0.5) ** 2
+
+
+def sightLine(dx: int, dy: int) -> tuple[tuple[int, int], ...]:
+    """
+    Offsets strictly between the centre and (dx, dy) that a wall must not be on for (dx, dy) to be seen
+    """
+    steps = max(abs(dx), abs(dy))
+    cells = []
+    for step in range(1, steps):
+        cell = (round(dx * step / steps), round(dy * step / steps))
+        if cell not in cells:
+            cells.append(cell)
+    return tuple(cells)
+
+
+@lru_cache(maxsize=None)
+def getSightLines(shape: str, radius: int) -> dict[tuple[int, int], tuple]:
+    """
+    :return: {(dx, dy): sight line} over the cells of the shape, to test single cells against
+    """
+    return {(dx, dy): line for dx, dy, line in getOffsets(shape, radius)}
+
+
+@lru_cache(maxsize=None)
+def getOffsets(shape: str, radius: int) -> tuple[tuple[int, int, tuple], ...]:
+    """
+    Computed once per shape and radius
+    :return: (dx, dy, sight line) of every cell in the shape, in row-major order like getGameData reports them
+    """
+    assert shape in SHAPES and radius >= 0
+    return tuple((dx, dy, sightLine(dx, dy))
+                 for dx in range(-radius, radius + 1)
+                 for dy in range(-radius, radius + 1)
+                 if inShape(shape, radius, dx, dy))
+
+
+class Vision:
+    def __init__(self, shape: str = SQUARE, radius: int = 2, lineOfSight: bool = False):
+        """
+        :param shape: SQUARE, DIAMOND (Manhattan distance) or CIRCLE (Euclidean distance)
+        :param lineOfSight: hide cells behind walls
+        """
+        assert shape in SHAPES
+        assert isinstance(radius, int) and radius >= 0
+        self.__shape = shape
+        self.__radius = radius
+        self.__lineOfSight = lineOfSight
+        self.__offsets = getOffsets(shape, radius)
+        self.__lines = getSightLines(shape, radius)
+
+    @property
+    def shape(self):
+        return self.__shape
+
+    @property
+    def radius(self):
+        return self.__radius
+
+    @property
+    def lineOfSight(self):
+        return self.__lineOfSight
+
+    def visibleCells(self, center: tuple[int, int], height: int, width: int, isWall: Callable[[tuple[int, int]], bool]) -> list[tuple[int, int]]:
+        """
+        :param isWall: tells whether a cell blocks sight, only called when lineOfSight is on
+        :return: cells on the board seen from center, in row-major order
+        """
+        centerX, centerY = center
+        cells = []
+        for dx, dy, line in self.__offsets:
+            x, y = centerX + dx, centerY + dy
+            if not (0 <= x < height and 0 <= y < width):
+                continue
+            # the line lies between the centre and a cell on the board, so it is on the board too
+            if self.__lineOfSight and any(isWall((centerX + bx, centerY + by)) for bx, by in line):
+                continue
+            cells.append((x, y))
+        return cells
+
+    def sees(self, center: tuple[int, int], loc: tuple[int, int], isWall: Callable[[tuple[int, int]], bool]) -> bool:
+        """
+        Whether loc is seen from center, for callers that already know which cells are worth asking about
+        """
+        line = self.__lines.get((loc[0] - center[0], loc[1] - center[1]))
+        if line is None:
+            return False
+        return not self.__lineOfSight or not any(isWall((center[0] + bx, center[1] + by)) for bx, by in line)
+
+    def toDict(self) -> dict:
+        return {'shape': self.__shape, 'radius': self.__radius, 'lineOfSight': self.__lineOfSight}
+
+    @classmethod
+    def fromDict(cls, data: dict) -> 'Vision':
+        return cls(data.get('shape', SQUARE), data.get('radius', 2), data.get('lineOfSight', False))
+
+    @classmethod
+    def parse(cls, text: str) -> 'Vision':
+        """
+        Reads a vision written as SHAPE:RADIUS, or SHAPE:RADIUS:los to hide cells behind walls, e.g. circle:4:los
+        """
+        parts = text.lower().split(':')
+        if len(parts) not in (2, 3) or parts[0] not in SHAPES or not parts[1].isdigit() or parts[2:] not in ([], ['los']):
+            raise ValueError(f"vision must be SHAPE:RADIUS[:los] with SHAPE one of {', '.join(SHAPES)}, not {text!r}")
+        return cls(parts[0], int(parts[1]), len(parts) == 3)
+
+    @classmethod
+    def fromMapInfo(cls, mapInfo: dict, playerName: str) -> 'Vision':
+        """
+        Vision of a player as announced on the map topic at game start, the default square if the server sent none
+        """
+        data = mapInfo.get('playerVision', {}).get(playerName, mapInfo.get('vision'))
+        return cls() if data is None else cls.fromDict(data)
+
+    def __eq__(self, other):
+        return isinstance(other, Vision) and self.toDict() == other.toDict()
+
+    def __hash__(self):
+        return hash((self.__shape, self.__radius, self.__lineOfSight))
+
+    def __repr__(self):
+        return f"Vision({self.__shape!r}, {self.__radius}, lineOfSight={self.__lineOfSight})"